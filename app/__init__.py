@@ -2,27 +2,57 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
+from app.cache import Cache
+from app.replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
+cache = Cache()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        # request.remote_addr passa a ser o cliente, não o proxy
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
 
     db.init_app(app)
+    from app import database, replica
+    database.init_app(app)
+    replica.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    cache.init_app(app)
     login_manager.login_view = 'main.login'
 
+    from app import aggregates  # registra os listeners do rollup mensal
+    from app import invoices  # registra os listeners das faturas
     from app.routes import main_bp
     app.register_blueprint(main_bp)
 
+    from app.api import api_bp
+    app.register_blueprint(api_bp)
+
+    from app.cli import rollup_cli, invoices_cli, recurring_cli, search_cli, perf_cli
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(invoices_cli)
+    app.cli.add_command(recurring_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(perf_cli)
+
+    from app import profiling, metrics, passwords, ratelimit
+    profiling.init_app(app)
+    metrics.init_app(app)
+    passwords.init_app(app)
+    ratelimit.init_app(app)
+
     return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models import User
-    return User.query.get(int(user_id))
+    from app.cache import get_user
+    return get_user(int(user_id))
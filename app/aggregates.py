@@ -0,0 +1,465 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import db
+from app.models import User, Transaction, Card, Budget, RecurringRule, MonthlySummary, from_cents
+from app.budgets import apply_budget_deltas, resync_budgets
+from app.invoices import remove_from_invoices
+from sqlalchemy import event, func, extract, and_, inspect, select, case, cast, literal, String
+from sqlalchemy.orm import joinedload
+
+# Forma de pagamento usada pelo resumo "Fatura do Cartão" no dashboard
+CREDIT_CARD_METHOD = 'Cartao de Credito'
+# No rollup, compras em cartões cadastrados são agrupadas por 'card:<id>' (renomear não mexe no rollup)
+CARD_KEY_PREFIX = 'card:'
+
+summary_table = MonthlySummary.__table__
+
+
+def month_range(year, month):
+    """Intervalo [início, fim) do mês, para filtros sargáveis em Transaction.date.
+
+    Levanta ValueError se o mês ou o ano forem inválidos.
+    """
+    start = datetime(year, month, 1)
+    if month == 12:
+        end = datetime(year + 1, 1, 1)
+    else:
+        end = datetime(year, month + 1, 1)
+    return start, end
+
+
+def month_transactions_query(user_id, year, month):
+    """Transações do usuário no mês, usando o índice composto (user_id, date)."""
+    start, end = month_range(year, month)
+    return Transaction.query.options(joinedload(Transaction.card)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start,
+        Transaction.date < end
+    ).order_by(Transaction.date.desc())
+
+
+def user_categories(user_id):
+    """Categorias distintas usadas pelo usuário (índice (user_id, category))."""
+    rows = db.session.query(Transaction.category).filter(
+        Transaction.user_id == user_id,
+        Transaction.category.isnot(None)
+    ).distinct().order_by(Transaction.category).all()
+    return [r[0] for r in rows if r[0]]
+
+
+def month_totals(user_id, year, month):
+    """Totais do mês lidos do rollup MonthlySummary, agrupados por (type, payment_method).
+
+    Retorna receitas, despesas, saldo e o total pago com 'Cartao de Credito'
+    ou com os cartões cadastrados.
+    """
+    rows = db.session.query(
+        MonthlySummary.type,
+        MonthlySummary.payment_method,
+        func.sum(MonthlySummary.total_cents)
+    ).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.year == year,
+        MonthlySummary.month == month
+    ).group_by(MonthlySummary.type, MonthlySummary.payment_method).all()
+
+    totals = {'income': 0, 'expense': 0, 'credit_card': 0}
+    for type_, payment_method, amount in rows:
+        if type_ == 'income':
+            totals['income'] += amount
+        elif type_ == 'expense':
+            totals['expense'] += amount
+            if payment_method == CREDIT_CARD_METHOD or payment_method.startswith(CARD_KEY_PREFIX):
+                totals['credit_card'] += amount
+
+    # As somas são feitas em centavos inteiros; a conversão para reais é só no final
+    totals['balance'] = totals['income'] - totals['expense']
+    for field in ('income', 'expense', 'balance', 'credit_card'):
+        totals[field] = from_cents(totals[field])
+    return totals
+
+
+def month_span(year, month, months=1):
+    """Primeiro e último (ano, mês) de um período de `months` meses terminando em (year, month)."""
+    if months < 1:
+        raise ValueError('O período deve ter ao menos um mês.')
+    month_range(year, month)
+    first = year * 12 + (month - 1) - (months - 1)
+    return (first // 12, first % 12 + 1), (year, month)
+
+
+def _summary_period(query, year, month, months):
+    (first_year, first_month), _ = month_span(year, month, months)
+    period = MonthlySummary.year * 12 + MonthlySummary.month
+    return query.filter(period.between(first_year * 12 + first_month, year * 12 + month))
+
+
+# As consultas de relatório são montadas separadas da execução para que a API
+# assíncrona (app/asgi.py) rode os mesmos SELECTs pelo seu próprio driver
+
+def category_totals_statement(user_id, year, month, type_='expense', months=1):
+    query = select(
+        MonthlySummary.category,
+        func.sum(MonthlySummary.total_cents)
+    ).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.type == type_
+    )
+    return _summary_period(query, year, month, months) \
+        .group_by(MonthlySummary.category).order_by(MonthlySummary.category)
+
+
+def category_totals_from_rows(rows):
+    return {(category or None): from_cents(cents) for category, cents in rows}
+
+
+def category_totals(user_id, year, month, type_='expense', months=1):
+    """Total por categoria no mês (ou nos `months` meses até ele), lido do rollup (O(categorias))."""
+    rows = db.session.execute(category_totals_statement(user_id, year, month, type_, months)).all()
+    return category_totals_from_rows(rows)
+
+
+def period_totals_statement(user_id, year, month, months=1):
+    query = select(MonthlySummary.type, func.sum(MonthlySummary.total_cents)) \
+        .filter(MonthlySummary.user_id == user_id)
+    return _summary_period(query, year, month, months).group_by(MonthlySummary.type)
+
+
+def period_totals_from_rows(rows):
+    totals = dict(rows)
+    income, expense = int(totals.get('income', 0)), int(totals.get('expense', 0))
+    return {'income': from_cents(income), 'expense': from_cents(expense), 'balance': from_cents(income - expense)}
+
+
+def period_totals(user_id, year, month, months=1):
+    """Receitas, despesas e saldo dos `months` meses até (year, month), lidos do rollup."""
+    return period_totals_from_rows(db.session.execute(period_totals_statement(user_id, year, month, months)).all())
+
+
+TREND_GRANULARITIES = ('day', 'week', 'month')
+
+
+def _trend_period(year, month, months):
+    (first_year, first_month), _ = month_span(year, month, months)
+    return month_range(first_year, first_month)[0], month_range(year, month)[1]
+
+
+def trend_series_statement(user_id, year, month, months=1, granularity='day'):
+    if granularity not in TREND_GRANULARITIES:
+        raise ValueError(f"Granularidade inválida (use {', '.join(TREND_GRANULARITIES)}).")
+    start, end = _trend_period(year, month, months)
+    if granularity == 'month':
+        query = select(MonthlySummary.year, MonthlySummary.month, MonthlySummary.type,
+                       func.sum(MonthlySummary.total_cents)).filter(MonthlySummary.user_id == user_id)
+        return _summary_period(query, year, month, months) \
+            .group_by(MonthlySummary.year, MonthlySummary.month, MonthlySummary.type)
+    t_year = extract('year', Transaction.date)
+    t_month = extract('month', Transaction.date)
+    t_day = extract('day', Transaction.date)
+    return select(t_year, t_month, t_day, Transaction.type, func.sum(Transaction.amount_cents)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start,
+        Transaction.date < end
+    ).group_by(t_year, t_month, t_day, Transaction.type)
+
+
+def trend_series(user_id, year, month, months=1, granularity='day'):
+    """Série de receitas x despesas por dia, semana ou mês, com buckets vazios preenchidos.
+
+    Por mês a série vem do rollup; por dia/semana vem de uma consulta agrupada
+    por (ano, mês, dia, tipo) em Transaction, usando o índice (user_id, date).
+    As semanas começam na segunda-feira.
+    """
+    rows = db.session.execute(trend_series_statement(user_id, year, month, months, granularity)).all()
+    return trend_series_from_rows(rows, year, month, months, granularity)
+
+
+def trend_series_from_rows(rows, year, month, months=1, granularity='day'):
+    start, end = _trend_period(year, month, months)
+    if granularity == 'month':
+        points = ((datetime(y, m, 1), type_, total) for y, m, type_, total in rows)
+    else:
+        points = ((datetime(int(y), int(m), int(d)), type_, total) for y, m, d, type_, total in rows)
+
+    def bucket(date):
+        if granularity == 'month':
+            return datetime(date.year, date.month, 1)
+        if granularity == 'week':
+            return max(date - timedelta(days=date.weekday()), start)
+        return date
+
+    buckets = []
+    current = start
+    while current < end:
+        if not buckets or bucket(current) != buckets[-1]:
+            buckets.append(bucket(current))
+        current = month_range(current.year, current.month)[1] if granularity == 'month' \
+            else current + timedelta(days=1)
+    index = {b: i for i, b in enumerate(buckets)}
+
+    # Acumulação vetorizada: índice do bucket + centavos de cada linha agrupada
+    points = list(points)
+    positions = np.fromiter((index[bucket(date)] for date, _, _ in points), dtype=np.int64, count=len(points))
+    cents = np.fromiter((total for _, _, total in points), dtype=np.float64, count=len(points))
+    is_income = np.fromiter((type_ == 'income' for _, type_, _ in points), dtype=bool, count=len(points))
+    income = np.bincount(positions[is_income], weights=cents[is_income], minlength=len(buckets)) / 100
+    expense = np.bincount(positions[~is_income], weights=cents[~is_income], minlength=len(buckets)) / 100
+
+    if granularity == 'month':
+        labels = [f"{b.month:02d}/{b.year}" for b in buckets]
+    else:
+        labels = [f"{b.day}/{b.month}" for b in buckets]
+    return {'labels': labels, 'income': income.tolist(), 'expense': expense.tolist()}
+
+
+def transaction_years(user_id):
+    """Anos em que o usuário possui transações (SELECT DISTINCT year)."""
+    year = extract('year', Transaction.date)
+    rows = db.session.query(year).filter(
+        Transaction.user_id == user_id,
+        Transaction.date.isnot(None)
+    ).distinct().order_by(year).all()
+    return [int(r[0]) for r in rows]
+
+
+# --- Manutenção do rollup MonthlySummary ---
+
+def payment_key(payment_method, card_id=None):
+    return f'{CARD_KEY_PREFIX}{card_id}' if card_id else (payment_method or '')
+
+
+def summary_key(user_id, date, type_, category, payment_method, card_id=None):
+    return (user_id, date.year, date.month, type_, category or '', payment_key(payment_method, card_id))
+
+
+def _key_where(key):
+    user_id, year, month, type_, category, payment_method = key
+    return and_(
+        summary_table.c.user_id == user_id,
+        summary_table.c.year == year,
+        summary_table.c.month == month,
+        summary_table.c.type == type_,
+        summary_table.c.category == category,
+        summary_table.c.payment_method == payment_method
+    )
+
+
+def data_version_statement(user_id):
+    return select(User.data_version).where(User.id == user_id)
+
+
+def data_version(user_id):
+    """Versão atual dos dados do usuário (lida do banco, consistente entre workers)."""
+    return db.session.execute(data_version_statement(user_id)).scalar() or 0
+
+
+def bump_data_version(connection, user_ids):
+    """Incrementa a versão dos dados dos usuários, na transação corrente."""
+    user_table = User.__table__
+    if user_ids:
+        connection.execute(user_table.update().where(user_table.c.id.in_(user_ids)).values(
+            data_version=func.coalesce(user_table.c.data_version, 0) + 1
+        ))
+
+
+def apply_summary_deltas(connection, deltas):
+    """Aplica {chave: [centavos, count]} ao rollup, na transação corrente."""
+    touched_users = set()
+    for key, (total, count) in deltas.items():
+        if not total and not count:
+            continue
+        touched_users.add(key[0])
+        result = connection.execute(
+            summary_table.update().where(_key_where(key)).values(
+                total_cents=summary_table.c.total_cents + total,
+                count=summary_table.c.count + count
+            )
+        )
+        if result.rowcount == 0:
+            user_id, year, month, type_, category, payment_method = key
+            connection.execute(summary_table.insert().values(
+                user_id=user_id, year=year, month=month, type=type_,
+                category=category, payment_method=payment_method,
+                total_cents=total, count=count
+            ))
+    if touched_users:
+        # Remove grupos que ficaram vazios
+        connection.execute(summary_table.delete().where(
+            summary_table.c.user_id.in_(touched_users),
+            summary_table.c.count <= 0
+        ))
+        apply_budget_deltas(connection, deltas)
+        bump_data_version(connection, touched_users)
+    return touched_users
+
+
+def _old_value(state, attr):
+    history = state.attrs[attr].load_history()
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_transaction_changes(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0])
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            if obj.date is None:
+                obj.date = datetime.utcnow()
+            key = summary_key(obj.user_id, obj.date, obj.type, obj.category, obj._payment_method, obj.card_id)
+            deltas[key][0] += obj.amount_cents
+            deltas[key][1] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            key = summary_key(obj.user_id, obj.date, obj.type, obj.category, obj._payment_method, obj.card_id)
+            deltas[key][0] -= obj.amount_cents
+            deltas[key][1] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            state = inspect(obj)
+            old_key = summary_key(*(_old_value(state, attr) for attr in
+                                     ('user_id', 'date', 'type', 'category', '_payment_method', 'card_id')))
+            new_key = summary_key(obj.user_id, obj.date, obj.type, obj.category, obj._payment_method,
+                                  obj.card_id)
+            deltas[old_key][0] -= _old_value(state, 'amount_cents')
+            deltas[old_key][1] -= 1
+            deltas[new_key][0] += obj.amount_cents
+            deltas[new_key][1] += 1
+
+    # Toda alteração entra nas páginas e projeções cacheadas por versão, mesmo a que não muda
+    # o rollup (descrição, data dentro do mesmo mês): transações, cartões, orçamentos e regras
+    versioned = (Transaction, Card, Budget, RecurringRule)
+    changed_users = {obj.user_id for obj in session.new | session.deleted if isinstance(obj, versioned)}
+    changed_users |= {obj.user_id for obj in session.dirty
+                      if isinstance(obj, versioned) and session.is_modified(obj)}
+    if deltas or changed_users:
+        touched_users = apply_summary_deltas(session.connection(), deltas)
+        bump_data_version(session.connection(), changed_users - touched_users)
+
+
+def move_payment_method(user_id, old_name, new_name):
+    """Reflete no rollup um UPDATE em massa de forma de pagamento (ex.: excluir um cartão).
+
+    `old_name`/`new_name` são chaves do rollup, como devolvidas por payment_key().
+    """
+    if old_name == new_name:
+        return
+    connection = db.session.connection()
+    rows = connection.execute(
+        select(summary_table.c.year, summary_table.c.month, summary_table.c.type,
+               summary_table.c.category, summary_table.c.total_cents, summary_table.c.count)
+        .where(summary_table.c.user_id == user_id,
+               summary_table.c.payment_method == (old_name or ''))
+    ).all()
+    deltas = defaultdict(lambda: [0, 0])
+    for year, month, type_, category, total, count in rows:
+        deltas[(user_id, year, month, type_, category, old_name or '')][0] -= total
+        deltas[(user_id, year, month, type_, category, old_name or '')][1] -= count
+        deltas[(user_id, year, month, type_, category, new_name or '')][0] += total
+        deltas[(user_id, year, month, type_, category, new_name or '')][1] += count
+    apply_summary_deltas(connection, deltas)
+
+
+def delete_transactions(user_id, start=None, end=None, category=None, chunk_size=1000):
+    """Apaga transações do usuário com DELETE em lotes, opcionalmente num período/categoria.
+
+    Cada lote é uma transação curta: os deltas do rollup são calculados com
+    uma consulta agrupada, o DELETE é feito por id e o lote é confirmado.
+    Retorna o número de linhas removidas.
+    """
+    conditions = [Transaction.user_id == user_id]
+    if start is not None:
+        conditions.append(Transaction.date >= start)
+    if end is not None:
+        conditions.append(Transaction.date < end)
+    if category:
+        conditions.append(Transaction.category == category)
+
+    removed = 0
+    while True:
+        ids = db.session.execute(
+            select(Transaction.id).where(*conditions).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        deltas = defaultdict(lambda: [0, 0])
+        for row in db.session.execute(_raw_summary_select(user_id).where(Transaction.id.in_(ids))):
+            key = (row[0], int(row[1]), int(row[2]), row[3], row[4], row[5])
+            deltas[key][0] -= int(row[6])
+            deltas[key][1] -= row[7]
+        apply_summary_deltas(db.session.connection(), deltas)
+        remove_from_invoices(db.session.connection(), user_id, ids)
+
+        removed += db.session.execute(
+            Transaction.__table__.delete().where(Transaction.id.in_(ids))
+        ).rowcount
+        db.session.commit()
+    return removed
+
+
+def _raw_summary_select(user_id=None):
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    category = func.coalesce(Transaction.category, '')
+    payment_method = case(
+        (Transaction.card_id.isnot(None), literal(CARD_KEY_PREFIX) + cast(Transaction.card_id, String)),
+        else_=func.coalesce(Transaction._payment_method, '')
+    )
+    query = select(
+        Transaction.user_id, year, month, Transaction.type, category, payment_method,
+        func.sum(Transaction.amount_cents), func.count(Transaction.id)
+    ).where(Transaction.date.isnot(None)).group_by(
+        Transaction.user_id, year, month, Transaction.type, category, payment_method
+    )
+    if user_id is not None:
+        query = query.where(Transaction.user_id == user_id)
+    return query
+
+
+def rebuild_monthly_summary(user_id=None):
+    """Recalcula o rollup a partir das transações (todas ou de um usuário)."""
+    delete = summary_table.delete()
+    if user_id is not None:
+        delete = delete.where(summary_table.c.user_id == user_id)
+    db.session.execute(delete)
+    result = db.session.execute(summary_table.insert().from_select(
+        ['user_id', 'year', 'month', 'type', 'category', 'payment_method', 'total_cents', 'count'],
+        _raw_summary_select(user_id)
+    ))
+    resync_budgets(user_id)
+    db.session.commit()
+    return result.rowcount
+
+
+def verify_monthly_summary(user_id=None):
+    """Compara o rollup com as transações e retorna a lista de divergências."""
+    expected = {}
+    for row in db.session.execute(_raw_summary_select(user_id)):
+        key = (row[0], int(row[1]), int(row[2]), row[3], row[4], row[5])
+        expected[key] = (int(row[6]), row[7])
+
+    query = select(summary_table)
+    if user_id is not None:
+        query = query.where(summary_table.c.user_id == user_id)
+    stored = {}
+    for row in db.session.execute(query):
+        key = (row.user_id, row.year, row.month, row.type, row.category, row.payment_method)
+        stored[key] = (row.total_cents, row.count)
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        exp_total, exp_count = expected.get(key, (0, 0))
+        got_total, got_count = stored.get(key, (0, 0))
+        if exp_count != got_count or exp_total != got_total:
+            mismatches.append((key, (exp_total, exp_count), (got_total, got_count)))
+    return mismatches
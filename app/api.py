@@ -1,8 +1,29 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app import db
-from app.models import User, Transaction, Card
+from app.models import User, Transaction, Card, RecurringRule, Budget, to_cents
+from app.aggregates import (month_range, month_span, category_totals_statement, category_totals_from_rows,
+                            period_totals_statement, period_totals_from_rows, trend_series_statement,
+                            trend_series_from_rows)
+from app.importer import import_transactions, DEFAULT_BATCH_SIZE
+from app.invoices import parse_closing_day
+from app.recurring import add_rule, materialize_due
+from app.search import search_terms, search_transactions
+from app.budgets import budget_status, serialize_budget, set_budget
+from app.forecast import forecast
+from app.passwords import authenticate
+from app.ratelimit import LoginThrottled
+from app.cache import get_user_cards, payment_fields
+from app.replica import read_replica
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_login import login_user, logout_user, current_user, login_required
+from sqlalchemy import and_, or_, select
+from datetime import datetime, timedelta
+import base64
+import binascii
+import csv
+import io
+import json
+import zlib
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
@@ -30,9 +51,13 @@ def login():
     if not data or "email" not in data or "password" not in data:
         return jsonify({"error": "Dados incompletos"}), 400
 
-    user = User.query.filter_by(email=data["email"]).first()
-    if user and user.check_password(data["password"]):
+    try:
+        user = authenticate(data["email"], data["password"], request.remote_addr)
+    except LoginThrottled as e:
+        return jsonify({"error": "Muitas tentativas de login"}), 429, {"Retry-After": str(e.retry_after)}
+    if user:
         login_user(user)
+        materialize_due(user.id)
         return jsonify({"message": "Login realizado com sucesso"})
     return jsonify({"error": "Credenciais inválidas"}), 401
 
@@ -46,40 +71,249 @@ def logout():
 
 # ---------------- TRANSACTIONS ---------------- #
 
+TRANSACTION_FIELDS = ("id", "type", "amount", "description", "payment_method", "category", "date")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(date, id):
+    raw = f"{date.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    date, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(date), int(id)
+
+
+def parse_date_arg(args, name, end_of_day=False):
+    """Lê um parâmetro YYYY-MM-DD; com end_of_day devolve o início do dia seguinte."""
+    value = args.get(name)
+    if not value:
+        return None
+    date = datetime.strptime(value, "%Y-%m-%d")
+    return date + timedelta(days=1) if end_of_day else date
+
+
+def filter_transactions(query, args=None, cards=None):
+    """Aplica os filtros de período, tipo, categoria e forma de pagamento da query string.
+
+    A API assíncrona (app/asgi.py) passa os args e os cartões do usuário
+    ({nome: id}) que ela mesma carregou; nas views, vêm de request e do cache.
+    """
+    args = request.args if args is None else args
+    start = parse_date_arg(args, "start")
+    end = parse_date_arg(args, "end", end_of_day=True)
+    year = args.get("year", type=int)
+    if year:
+        # Mesmo filtro de mês/ano da página de relatórios; sem mês, o ano inteiro
+        month = args.get("month", type=int)
+        if month:
+            start, end = month_range(year, month)
+        else:
+            start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    if start:
+        query = query.filter(Transaction.date >= start)
+    if end:
+        query = query.filter(Transaction.date < end)
+    for field in ("type", "category"):
+        value = args.get(field)
+        if value:
+            query = query.filter(getattr(Transaction, field) == value)
+    payment_method = args.get("payment_method")
+    if payment_method:
+        # Cartões cadastrados são filtrados pelo card_id (índice), os demais métodos pelo nome
+        if cards is None:
+            card_id = payment_fields(current_user.id, payment_method)["card_id"]
+        else:
+            card_id = cards.get(payment_method)
+        if card_id:
+            query = query.filter(Transaction.card_id == card_id)
+        else:
+            query = query.filter(Transaction._payment_method == payment_method)
+    return query
+
+
+def serialize_transaction(row, fields=TRANSACTION_FIELDS):
+    data = {field: getattr(row, field) for field in fields}
+    if "date" in data and data["date"] is not None:
+        data["date"] = data["date"].isoformat()
+    return data
+
+
+def transaction_fields_arg(args):
+    """Campos pedidos em ?fields= (todos por padrão); None se algum for inválido."""
+    fields = args.get("fields")
+    fields = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else TRANSACTION_FIELDS
+    if not fields or any(f not in TRANSACTION_FIELDS for f in fields):
+        return None
+    return fields
+
+
+def transactions_page_statement(user_id, args, fields, cards=None):
+    """SELECT de uma página da listagem (limit + 1 linhas a partir do cursor) e o limit usado."""
+    limit = min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    # Só as colunas pedidas (mais date e id, usados pelo cursor) são lidas do banco
+    columns = set(fields) | {"id", "date"}
+    query = select(*(getattr(Transaction, f).label(f) for f in TRANSACTION_FIELDS if f in columns)) \
+        .filter(Transaction.user_id == user_id)
+    query = filter_transactions(query, args, cards)
+
+    cursor = args.get("cursor")
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Transaction.date < cursor_date,
+            and_(Transaction.date == cursor_date, Transaction.id < cursor_id)
+        ))
+    return query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1), limit
+
+
+def transactions_page(rows, fields, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return {
+        "transactions": [serialize_transaction(r, fields) for r in rows],
+        "next_cursor": next_cursor
+    }
+
+
 @api_bp.route("/transactions", methods=["GET"])
 @login_required
+@read_replica
 def get_transactions():
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    return jsonify([
-        {
-            "id": t.id,
-            "type": t.type,
-            "amount": t.amount,
-            "description": t.description,
-            "payment_method": t.payment_method,
-            "category": t.category,
-            "date": t.date.isoformat()
-        } for t in transactions
-    ])
+    fields = transaction_fields_arg(request.args)
+    if fields is None:
+        return jsonify({"error": f"Campos válidos: {', '.join(TRANSACTION_FIELDS)}"}), 400
+    try:
+        statement, limit = transactions_page_statement(current_user.id, request.args, fields)
+    except (ValueError, TypeError, UnicodeDecodeError, binascii.Error):
+        return jsonify({"error": "Parâmetros inválidos"}), 400
+
+    rows = db.session.execute(statement).all()
+    return jsonify(transactions_page(rows, fields, limit))
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_rows(query, fmt):
+    """Gera o export em blocos de EXPORT_BATCH_SIZE linhas, lendo o banco com yield_per."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(TRANSACTION_FIELDS)
+        yield buffer.getvalue()
+
+    result = db.session.execute(query.statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for batch in result.partitions():
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in batch:
+                writer.writerow([row.id, row.type, row.amount, row.description, row.payment_method,
+                                 row.category, row.date.isoformat() if row.date else ""])
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(serialize_transaction(row), ensure_ascii=False) + "\n" for row in batch)
+
+
+def gzip_chunks(chunks):
+    """Comprime o stream sem bufferizar: cada bloco é enviado com Z_SYNC_FLUSH."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+@api_bp.route("/transactions/search", methods=["GET"])
+@login_required
+def search_transactions_api():
+    try:
+        limit = min(max(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        offset = int(request.args.get("offset", 0))
+        query = filter_transactions(Transaction.query)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Parâmetros inválidos"}), 400
+    if not search_terms(request.args.get("q")):
+        return jsonify({"error": "Informe o termo de busca (q)"}), 400
+
+    rows, next_offset = search_transactions(current_user.id, request.args["q"], limit, offset, query)
+    return jsonify({
+        "transactions": [serialize_transaction(r) for r in rows],
+        "next_offset": next_offset
+    })
+
+
+@api_bp.route("/transactions/export", methods=["GET"])
+@login_required
+@read_replica
+def export_transactions():
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "Formato inválido (use csv ou ndjson)"}), 400
+    try:
+        query = filter_transactions(
+            db.session.query(*(getattr(Transaction, f) for f in TRANSACTION_FIELDS))
+                      .filter(Transaction.user_id == current_user.id)
+        ).order_by(Transaction.date, Transaction.id)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Parâmetros inválidos"}), 400
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f"attachment; filename=transacoes.{fmt}"}
+    chunks = export_rows(query, fmt)
+    if request.args.get("gzip") in ("1", "true"):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_chunks(chunks)
+    else:
+        body = (chunk.encode() for chunk in chunks)
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
 
 
 @api_bp.route("/transactions", methods=["POST"])
 @login_required
 def add_transaction():
     data = request.json
-    t = Transaction(
-        type=data["type"],
-        amount=data["amount"],
-        description=data.get("description"),
-        payment_method=data.get("payment_method"),
-        category=data.get("category"),
-        user_id=current_user.id
-    )
+    try:
+        t = Transaction(
+            type=data["type"],
+            amount=data["amount"],
+            description=data.get("description"),
+            category=data.get("category"),
+            user_id=current_user.id,
+            **payment_fields(current_user.id, data.get("payment_method"))
+        )
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Dados inválidos"}), 400
     db.session.add(t)
     db.session.commit()
     return jsonify({"message": "Transação adicionada com sucesso"}), 201
 
 
+@api_bp.route("/transactions/import", methods=["POST"])
+@login_required
+def import_transactions_api():
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get("format") or (upload.filename.rsplit(".", 1)[-1].lower() if upload else "json")
+    try:
+        result = import_transactions(
+            current_user.id, stream, fmt,
+            batch_size=min(max(request.args.get("batch_size", DEFAULT_BATCH_SIZE, type=int), 1), 10000),
+            dry_run=request.args.get("dry_run") in ("1", "true"),
+            skip_invalid=request.args.get("skip_invalid") in ("1", "true"),
+            default_payment_method=request.args.get("payment_method")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status = 201 if result["committed"] else (422 if result["error_count"] else 200)
+    return jsonify(result), status
+
+
 @api_bp.route("/transactions/<int:id>", methods=["PUT"])
 @login_required
 def update_transaction(id):
@@ -89,9 +323,14 @@ def update_transaction(id):
 
     data = request.json
     t.type = data.get("type", t.type)
-    t.amount = data.get("amount", t.amount)
+    try:
+        t.amount = data.get("amount", t.amount)
+    except ValueError:
+        return jsonify({"error": "Dados inválidos"}), 400
     t.description = data.get("description", t.description)
-    t.payment_method = data.get("payment_method", t.payment_method)
+    if "payment_method" in data:
+        for field, value in payment_fields(current_user.id, data["payment_method"]).items():
+            setattr(t, field, value)
     t.category = data.get("category", t.category)
     db.session.commit()
     return jsonify({"message": "Transação atualizada"})
@@ -108,24 +347,237 @@ def delete_transaction(id):
     return jsonify({"message": "Transação removida"})
 
 
+# ---------------- REPORTS ---------------- #
+
+SUMMARY_SERIES = ("totals", "categories", "trend")
+
+
+def summary_statements(user_id, args):
+    """Parâmetros do resumo e os SELECTs das séries pedidas ({série: statement}).
+
+    Levanta ValueError se algum parâmetro for inválido.
+    """
+    now = datetime.now()
+    year = args.get("year", now.year, type=int)
+    month = args.get("month", now.month, type=int)
+    months = min(args.get("months", 1, type=int), 120)
+    granularity = args.get("granularity", "day" if months == 1 else "month")
+    series = args.get("series")
+    series = series.split(",") if series else SUMMARY_SERIES
+    if any(s not in SUMMARY_SERIES for s in series):
+        raise ValueError(f"Séries válidas: {', '.join(SUMMARY_SERIES)}")
+    month_span(year, month, months)
+
+    params = {"year": year, "month": month, "months": months, "granularity": granularity}
+    statements = {}
+    if "trend" in series:
+        statements["trend"] = trend_series_statement(user_id, year, month, months, granularity)
+    if "totals" in series:
+        statements["totals"] = period_totals_statement(user_id, year, month, months)
+    if "categories" in series:
+        statements["categories"] = category_totals_statement(user_id, year, month, "expense", months)
+    return params, statements
+
+
+def summary_from_rows(params, rows):
+    """Resposta do resumo a partir das linhas de cada SELECT de summary_statements."""
+    data = dict(params)
+    if "trend" in rows:
+        data["trend"] = trend_series_from_rows(rows["trend"], params["year"], params["month"],
+                                               params["months"], params["granularity"])
+    if "totals" in rows:
+        data["totals"] = period_totals_from_rows(rows["totals"])
+    if "categories" in rows:
+        by_category = category_totals_from_rows(rows["categories"])
+        data["categories"] = {"labels": list(by_category.keys()), "data": list(by_category.values())}
+    return data
+
+
+@api_bp.route("/reports/summary", methods=["GET"])
+@login_required
+@read_replica
+def reports_summary():
+    """Séries dos gráficos de relatórios em JSON, para atualizar a página sem recarregar.
+
+    Parâmetros: year, month (padrão: mês atual), months (meses até year/month,
+    padrão 1), granularity (day|week|month) e series (totals,categories,trend).
+    """
+    try:
+        params, statements = summary_statements(current_user.id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = {name: db.session.execute(statement).all() for name, statement in statements.items()}
+    return jsonify(summary_from_rows(params, rows))
+
+
+@api_bp.route("/forecast", methods=["GET"])
+@login_required
+def cash_flow_forecast():
+    """Projeção de receitas, despesas e saldo por categoria para os próximos `months` meses (padrão 6)."""
+    try:
+        return jsonify(forecast(current_user.id, request.args.get("months", 6, type=int)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 # ---------------- CARDS ---------------- #
 
+CARD_FIELDS = ("id", "name", "due_day", "closing_day")
+
 @api_bp.route("/cards", methods=["GET"])
 @login_required
+@read_replica
 def get_cards():
-    cards = Card.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{"id": c.id, "name": c.name, "due_day": c.due_day} for c in cards])
+    cards = get_user_cards(current_user.id)
+    return jsonify([{field: getattr(c, field) for field in CARD_FIELDS} for c in cards])
 
 
 @api_bp.route("/cards", methods=["POST"])
 @login_required
 def add_card():
     data = request.json
+    name = data.get("name")
+    if not name or not isinstance(name, str):
+        return jsonify({"error": "Nome do cartão obrigatório"}), 400
+    try:
+        due_day = int(data.get("due_day"))
+        if not 1 <= due_day <= 31:
+            raise ValueError()
+    except (TypeError, ValueError):
+        return jsonify({"error": "Dia de vencimento inválido"}), 400
+    try:
+        closing_day = parse_closing_day(data.get("closing_day"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Dia de fechamento inválido"}), 400
     c = Card(
-        name=data["name"],
-        due_day=data["due_day"],
+        name=name,
+        due_day=due_day,
+        closing_day=closing_day,
         user_id=current_user.id
     )
     db.session.add(c)
     db.session.commit()
     return jsonify({"message": "Cartão adicionado com sucesso"}), 201
+
+
+# ---------------- RECURRING ---------------- #
+
+def serialize_rule(rule):
+    return {
+        "id": rule.id,
+        "type": rule.type,
+        "amount": rule.amount,
+        "description": rule.description,
+        "category": rule.category,
+        "payment_method": rule.card.name if rule.card_id else rule.payment_method,
+        "frequency": rule.frequency,
+        "start_date": rule.start_date.isoformat(),
+        "next_date": rule.next_date.isoformat(),
+        "end_date": rule.end_date.isoformat() if rule.end_date else None,
+        "active": rule.active,
+    }
+
+
+@api_bp.route("/recurring", methods=["GET"])
+@login_required
+def get_recurring_rules():
+    rules = RecurringRule.query.filter_by(user_id=current_user.id).order_by(RecurringRule.next_date).all()
+    return jsonify([serialize_rule(r) for r in rules])
+
+
+@api_bp.route("/recurring", methods=["POST"])
+@login_required
+def add_recurring_rule():
+    data = request.json
+    try:
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+        rule = add_rule(
+            current_user.id,
+            data.get("frequency", "monthly"),
+            start_date=datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None,
+            end_date=datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None,
+            type=data["type"],
+            amount=data["amount"],
+            description=data.get("description"),
+            category=data.get("category"),
+            **payment_fields(current_user.id, data.get("payment_method"))
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e) if isinstance(e, ValueError) else "Dados inválidos"}), 400
+    return jsonify(serialize_rule(rule)), 201
+
+
+@api_bp.route("/recurring/<int:id>", methods=["DELETE"])
+@login_required
+def delete_recurring_rule(id):
+    rule = RecurringRule.query.get_or_404(id)
+    if rule.user_id != current_user.id:
+        return jsonify({"error": "Não autorizado"}), 403
+    # As transações já geradas continuam; só as próximas deixam de ser criadas
+    db.session.delete(rule)
+    db.session.commit()
+    return jsonify({"message": "Regra recorrente removida"})
+
+
+# ---------------- BUDGETS ---------------- #
+
+def budget_month_args():
+    """year/month da query string (padrão: mês atual); levanta ValueError se inválidos."""
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+    month_range(year, month)
+    return year, month
+
+
+@api_bp.route("/budgets", methods=["GET"])
+@login_required
+def get_budgets():
+    try:
+        year, month = budget_month_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(budget_status(current_user.id, year, month))
+
+
+@api_bp.route("/budgets/over", methods=["GET"])
+@login_required
+def get_over_budgets():
+    """Categorias que passaram do limite no mês."""
+    try:
+        year, month = budget_month_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(budget_status(current_user.id, year, month, over_only=True))
+
+
+@api_bp.route("/budgets", methods=["POST"])
+@login_required
+def save_budget():
+    data = request.json
+    now = datetime.now()
+    try:
+        year = int(data.get("year", now.year))
+        month = int(data.get("month", now.month))
+        month_range(year, month)
+        limit_cents = to_cents(data["limit"])
+        if limit_cents <= 0 or not data.get("category"):
+            raise ValueError("Categoria e limite positivo são obrigatórios")
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e) if isinstance(e, ValueError) else "Dados inválidos"}), 400
+    budget = set_budget(current_user.id, data["category"], year, month, limit_cents)
+    return jsonify(serialize_budget(budget)), 201
+
+
+@api_bp.route("/budgets/<int:id>", methods=["DELETE"])
+@login_required
+def delete_budget(id):
+    budget = Budget.query.get_or_404(id)
+    if budget.user_id != current_user.id:
+        return jsonify({"error": "Não autorizado"}), 403
+    db.session.delete(budget)
+    db.session.commit()
+    return jsonify({"message": "Orçamento removido"})
@@ -0,0 +1,194 @@
+import binascii
+import logging
+import time
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_cookie
+
+from config import async_engine_options
+
+logger = logging.getLogger(__name__)
+
+# Drivers assíncronos equivalentes aos síncronos da aplicação
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'Sem driver assíncrono para {backend}.')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_engine_for(app, url):
+    from app.database import apply_sqlite_pragmas
+
+    engine = create_async_engine(async_database_url(url), **async_engine_options(str(url)))
+    if engine.dialect.name == 'sqlite' and app.config.get('SQLITE_TUNING'):
+        pragmas = app.config['SQLITE_PRAGMAS']
+
+        @event.listens_for(engine.sync_engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+    return engine
+
+
+class _ConcurrentWsgiInstance(WsgiToAsgiInstance):
+    # O padrão do asgiref (thread_sensitive=True) roda todas as requisições WSGI do processo
+    # numa única thread: um login (hash de senha) travaria as demais rotas do Flask
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class ConcurrentWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi que atende as requisições WSGI em paralelo, no thread pool do event loop."""
+
+    async def __call__(self, scope, receive, send):
+        await _ConcurrentWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class AsyncAPI:
+    """Aplicação ASGI: leituras da API atendidas com I/O assíncrono, o resto pelo Flask.
+
+    GET /api/transactions, /api/cards e /api/reports/summary rodam no event
+    loop com aiosqlite/asyncpg, de modo que um processo atende muitas
+    conexões simultâneas. Usam os mesmos SELECTs das views do Flask, a
+    sessão do Flask-Login (cookie assinado) e, com DATABASE_REPLICA_URL, a
+    réplica, respeitando a janela de leitura no primário após escritas.
+    Todas as outras rotas, e requisições sem sessão (login, lembrar-me),
+    vão para o Flask, em paralelo no thread pool do event loop.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = ConcurrentWsgiToAsgi(flask_app)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.engine = create_engine_for(flask_app, flask_app.config['SQLALCHEMY_DATABASE_URI'])
+        replica = flask_app.config.get('SQLALCHEMY_BINDS', {}).get('replica')
+        self.replica_engine = create_engine_for(flask_app, replica['url']) if replica else None
+        self.routes = {
+            '/api/transactions': ('api.get_transactions', self.get_transactions),
+            '/api/cards': ('api.get_cards', self.get_cards),
+            '/api/reports/summary': ('api.reports_summary', self.reports_summary),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        route = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        session = self.load_session(scope) if route else None
+        if not session or '_user_id' not in session:
+            return await self.wsgi(scope, receive, send)
+
+        from app.metrics import metrics
+
+        endpoint, handler = route
+        started = time.perf_counter()
+        metrics.gauge_add('http_requests_in_flight', 1)
+        try:
+            args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+            engine = self.engine
+            if self.replica_engine is not None and session.get('primary_until', 0) <= time.time():
+                engine = self.replica_engine
+            async with engine.connect() as connection:
+                status, data = await handler(connection, int(session['_user_id']), args)
+        except Exception:
+            logger.exception('Erro em %s', scope['path'])
+            status, data = 500, {'error': 'Erro interno'}
+        finally:
+            metrics.gauge_add('http_requests_in_flight', -1)
+        await self.send_json(send, status, data)
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        endpoint=endpoint, method='GET')
+        metrics.flush()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                if self.replica_engine is not None:
+                    await self.replica_engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def load_session(self, scope):
+        """Sessão do Flask lida do cookie assinado (None se ausente, adulterada ou expirada)."""
+        cookie = b'; '.join(value for name, value in scope['headers'] if name == b'cookie')
+        value = parse_cookie(cookie.decode('latin-1')).get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not value:
+            return None
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return self.serializer.loads(value, max_age=max_age)
+        except Exception:
+            return None
+
+    async def send_json(self, send, status, data):
+        body = self.flask_app.json.dumps(data).encode()
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'vary', b'Cookie'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # --- Endpoints ---
+
+    async def user_cards(self, connection, user_id):
+        """Cartões do usuário pelo mesmo cache (cards_key) das views síncronas."""
+        from app import cache
+        from app.aggregates import data_version_statement
+        from app.cache import cards_key, user_cards_statement
+
+        key = cards_key(user_id, (await connection.execute(data_version_statement(user_id))).scalar() or 0)
+        cards = cache.get(key)
+        if cards is None:
+            cards = [dict(row._mapping) for row in await connection.execute(user_cards_statement(user_id))]
+            cache.set(key, cards)
+        return cards
+
+    async def get_transactions(self, connection, user_id, args):
+        from app.api import TRANSACTION_FIELDS, transaction_fields_arg, transactions_page_statement, transactions_page
+
+        fields = transaction_fields_arg(args)
+        if fields is None:
+            return 400, {'error': f"Campos válidos: {', '.join(TRANSACTION_FIELDS)}"}
+        cards = None
+        if args.get('payment_method'):
+            cards = {card['name']: card['id'] for card in await self.user_cards(connection, user_id)}
+        try:
+            statement, limit = transactions_page_statement(user_id, args, fields, cards)
+        except (ValueError, TypeError, UnicodeDecodeError, binascii.Error):
+            return 400, {'error': 'Parâmetros inválidos'}
+        rows = (await connection.execute(statement)).all()
+        return 200, transactions_page(rows, fields, limit)
+
+    async def get_cards(self, connection, user_id, args):
+        from app.api import CARD_FIELDS
+
+        cards = await self.user_cards(connection, user_id)
+        return 200, [{field: card[field] for field in CARD_FIELDS} for card in cards]
+
+    async def reports_summary(self, connection, user_id, args):
+        from app.api import summary_statements, summary_from_rows
+
+        try:
+            params, statements = summary_statements(user_id, args)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        rows = {name: (await connection.execute(statement)).all() for name, statement in statements.items()}
+        return 200, summary_from_rows(params, rows)
+
+
+def create_asgi_app():
+    from app import create_app
+    return AsyncAPI(create_app())
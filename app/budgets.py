@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from app import db
+from app.models import Budget, MonthlySummary, from_cents
+from sqlalchemy import case, func, select
+
+# A partir desta fração do limite o orçamento entra em alerta
+WARNING_RATIO = 0.8
+
+budget_table = Budget.__table__
+
+
+def alert_state(spent_cents, limit_cents):
+    """'ok', 'warning' (>= 80% do limite) ou 'over' (acima do limite); aceita colunas SQL."""
+    if isinstance(spent_cents, int) and isinstance(limit_cents, int):
+        if spent_cents > limit_cents:
+            return 'over'
+        return 'warning' if spent_cents >= limit_cents * WARNING_RATIO else 'ok'
+    return case(
+        (spent_cents > limit_cents, 'over'),
+        (spent_cents >= limit_cents * WARNING_RATIO, 'warning'),
+        else_='ok'
+    )
+
+
+def apply_budget_deltas(connection, deltas):
+    """Aplica ao gasto dos orçamentos os deltas de despesa do rollup e recalcula o alerta.
+
+    Recebe as mesmas chaves de apply_summary_deltas; só o total de despesas por
+    (usuário, ano, mês, categoria) importa, então o mês nunca é somado de novo.
+    """
+    spent = defaultdict(int)
+    for (user_id, year, month, type_, category, _), (total, _) in deltas.items():
+        if type_ == 'expense' and category and total:
+            spent[(user_id, year, month, category)] += total
+
+    for (user_id, year, month, category), total in spent.items():
+        if not total:
+            continue
+        new_spent = budget_table.c.spent_cents + total
+        connection.execute(budget_table.update().where(
+            budget_table.c.user_id == user_id,
+            budget_table.c.year == year,
+            budget_table.c.month == month,
+            budget_table.c.category == category
+        ).values(spent_cents=new_spent, alert=alert_state(new_spent, budget_table.c.limit_cents)))
+
+
+def resync_budgets(user_id=None):
+    """Recalcula o gasto e o alerta dos orçamentos a partir do rollup (usado após reconstruí-lo)."""
+    spent = select(func.coalesce(func.sum(MonthlySummary.total_cents), 0)).where(
+        MonthlySummary.user_id == budget_table.c.user_id,
+        MonthlySummary.year == budget_table.c.year,
+        MonthlySummary.month == budget_table.c.month,
+        MonthlySummary.type == 'expense',
+        MonthlySummary.category == budget_table.c.category
+    ).scalar_subquery()
+    update = budget_table.update().values(spent_cents=spent)
+    if user_id is not None:
+        update = update.where(budget_table.c.user_id == user_id)
+    db.session.execute(update)
+    alert = budget_table.update().values(alert=alert_state(budget_table.c.spent_cents, budget_table.c.limit_cents))
+    if user_id is not None:
+        alert = alert.where(budget_table.c.user_id == user_id)
+    db.session.execute(alert)
+
+
+def set_budget(user_id, category, year, month, limit_cents):
+    """Cria ou altera o limite de um orçamento; o gasto inicial vem do rollup do mês."""
+    budget = Budget.query.filter_by(user_id=user_id, year=year, month=month, category=category).first()
+    if budget is None:
+        spent = db.session.query(func.coalesce(func.sum(MonthlySummary.total_cents), 0)).filter(
+            MonthlySummary.user_id == user_id,
+            MonthlySummary.year == year,
+            MonthlySummary.month == month,
+            MonthlySummary.type == 'expense',
+            MonthlySummary.category == category
+        ).scalar()
+        budget = Budget(user_id=user_id, category=category, year=year, month=month, spent_cents=int(spent))
+        db.session.add(budget)
+    budget.limit_cents = limit_cents
+    budget.alert = alert_state(budget.spent_cents, limit_cents)
+    db.session.commit()
+    return budget
+
+
+def serialize_budget(budget):
+    """Consumo de um orçamento em reais (aceita o modelo ou uma linha da tabela)."""
+    return {
+        'id': budget.id,
+        'category': budget.category,
+        'year': budget.year,
+        'month': budget.month,
+        'limit': from_cents(budget.limit_cents),
+        'spent': from_cents(budget.spent_cents),
+        'remaining': from_cents(budget.limit_cents - budget.spent_cents),
+        'percent': round(budget.spent_cents * 100 / budget.limit_cents, 1) if budget.limit_cents else None,
+        'alert': budget.alert,
+    }
+
+
+def budget_status(user_id, year, month, over_only=False):
+    """Orçamentos do mês com consumo e alerta, numa única consulta pelo índice (user_id, year, month)."""
+    query = select(budget_table).where(
+        budget_table.c.user_id == user_id,
+        budget_table.c.year == year,
+        budget_table.c.month == month
+    ).order_by(budget_table.c.category)
+    if over_only:
+        query = query.where(budget_table.c.alert == 'over')
+    return [serialize_budget(row) for row in db.session.execute(query)]
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import g, has_app_context, request, session, make_response
+
+
+class LRUBackend:
+    """Cache em memória do processo, com TTL e descarte LRU."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Cache compartilhado em um servidor compatível com Redis (pacote opcional `redis`)."""
+
+    def __init__(self, url, prefix='meubolso:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class Cache:
+    """Fachada do cache: backend plugável, TTL padrão e contadores de hit/miss."""
+
+    def __init__(self):
+        self.backend = LRUBackend()
+        self.default_ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.default_ttl = app.config.get('CACHE_TTL', 300)
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif backend == 'memory':
+            self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+        else:
+            raise ValueError(f'CACHE_BACKEND desconhecido: {backend}')
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, self.default_ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+        if has_app_context():
+            g.pop('cache_' + key, None)
+
+    def stats(self):
+        """Contadores do processo; exportados em /metrics (cache_requests_total)."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+
+# --- Objetos cacheados ---
+# Os valores guardados são dicionários simples; na leitura eles viram instâncias
+# "detached" anexadas à sessão com merge(load=False), sem nenhuma consulta.
+
+def _attach(model, data):
+    from sqlalchemy.orm import make_transient_to_detached
+    from app import db
+    obj = model(**data)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def _memoized(key, loader):
+    """Busca no g (por requisição), depois no backend e por último no banco."""
+    from app import cache
+    g_key = 'cache_' + key
+    if has_app_context() and g_key in g:
+        return g.get(g_key)
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        if value is not None:
+            cache.set(key, value)
+    if has_app_context():
+        setattr(g, g_key, value)
+    return value
+
+
+def get_user(user_id):
+    from app import db
+    from app.models import User
+
+    def load():
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # Só o que as views usam: o hash da senha não vai para o backend (que pode ser o Redis)
+        return {'id': user.id, 'username': user.username, 'email': user.email}
+
+    data = _memoized(f'user:{user_id}', load)
+    return _attach(User, data) if data else None
+
+
+def user_cards_statement(user_id):
+    """SELECT dos dados de cartão guardados no cache (também usado pela API assíncrona)."""
+    from sqlalchemy import select
+    from app.models import Card
+    return select(Card.id, Card.name, Card.due_day, Card.closing_day, Card.user_id) \
+        .where(Card.user_id == user_id).order_by(Card.id)
+
+
+def cards_key(user_id, version):
+    """Chave da lista de cartões: User.data_version muda a cada escrita em Card, então
+    uma alteração feita em um worker vira miss em todos os outros (backend em memória)."""
+    return f'cards:{user_id}:{version}'
+
+
+def get_user_cards(user_id):
+    from app import db
+    from app.aggregates import data_version
+    from app.models import Card
+
+    def load():
+        return [dict(row._mapping) for row in db.session.execute(user_cards_statement(user_id))]
+
+    return [_attach(Card, data) for data in _memoized(cards_key(user_id, data_version(user_id)), load)]
+
+
+def payment_fields(user_id, payment_method):
+    """card_id quando a forma de pagamento é um cartão cadastrado; senão o método simples."""
+    for card in get_user_cards(user_id):
+        if card.name == payment_method:
+            return {'payment_method': None, 'card_id': card.id}
+    return {'payment_method': payment_method, 'card_id': None}
+
+
+def invalidate_user(user_id):
+    from app import cache
+    cache.delete(f'user:{user_id}')
+
+
+# --- Cache de páginas por versão dos dados ---
+
+def versioned_page(view):
+    """ETag/304 e cache do HTML renderizado, por (usuário, versão, endpoint, filtros).
+
+    Qualquer escrita em transações ou cartões incrementa User.data_version,
+    o que muda a chave e invalida naturalmente as entradas antigas. Páginas
+    com mensagens flash pendentes nunca são servidas do cache.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask_login import current_user
+        from app import cache
+        from app.aggregates import data_version
+
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        # A data entra na chave porque sem filtros as páginas mostram o mês atual
+        key = 'page:{}:{}:{}:{}:{}'.format(current_user.id, data_version(current_user.id),
+                                           request.endpoint, date.today().isoformat(),
+                                           request.query_string.decode())
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            html = cache.get(key)
+            if html is None:
+                html = view(*args, **kwargs)
+                if not isinstance(html, str):
+                    return html
+                if not session.get('_flashes'):
+                    cache.set(key, html)
+            response = make_response(html)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
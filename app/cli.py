@@ -0,0 +1,142 @@
+import click
+from flask.cli import AppGroup
+
+rollup_cli = AppGroup('rollup', help='Manutenção do resumo mensal (MonthlySummary).')
+
+
+@rollup_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Reconstrói apenas um usuário.')
+def rebuild_command(user_id):
+    """Reconstrói o rollup a partir das transações."""
+    from app.aggregates import rebuild_monthly_summary
+    rows = rebuild_monthly_summary(user_id)
+    click.echo(f'Rollup reconstruído: {rows} grupos.')
+
+
+@rollup_cli.command('verify')
+@click.option('--user-id', type=int, default=None, help='Verifica apenas um usuário.')
+def verify_command(user_id):
+    """Compara o rollup com as transações; sai com código 1 se houver divergências."""
+    from app.aggregates import verify_monthly_summary
+    mismatches = verify_monthly_summary(user_id)
+    for key, expected, stored in mismatches:
+        click.echo(f'{key}: esperado={expected} armazenado={stored}')
+    if mismatches:
+        click.echo(f'{len(mismatches)} divergência(s) encontrada(s).')
+        raise SystemExit(1)
+    click.echo('Rollup consistente.')
+
+
+invoices_cli = AppGroup('invoices', help='Manutenção das faturas de cartão (Invoice).')
+
+
+@invoices_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Reconstrói apenas um usuário.')
+def rebuild_invoices_command(user_id):
+    """Recalcula as faturas a partir das transações e dos ciclos dos cartões."""
+    from app import db
+    from app.models import User
+    from app.invoices import rebuild_user_invoices
+    user_ids = [user_id] if user_id else [u.id for u in User.query.with_entities(User.id)]
+    for uid in user_ids:
+        rebuild_user_invoices(uid)
+    db.session.commit()
+    click.echo(f'Faturas reconstruídas para {len(user_ids)} usuário(s).')
+
+
+@invoices_cli.command('close')
+@click.option('--user-id', type=int, default=None, help='Fecha apenas as faturas de um usuário.')
+def close_invoices_command(user_id):
+    """Marca como fechadas as faturas cujo fechamento já passou (para rodar via cron)."""
+    from app import db
+    from app.invoices import refresh_invoice_status
+    closed = refresh_invoice_status(user_id)
+    db.session.commit()
+    click.echo(f'{closed} fatura(s) fechada(s).')
+
+
+recurring_cli = AppGroup('recurring', help='Transações recorrentes (RecurringRule).')
+
+
+@recurring_cli.command('run')
+@click.option('--user-id', type=int, default=None, help='Processa apenas um usuário.')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Gera as ocorrências até esta data (padrão: hoje).')
+def run_recurring_command(user_id, until):
+    """Gera as transações recorrentes vencidas (para rodar via cron)."""
+    from app.recurring import materialize_due
+    created = materialize_due(user_id, until.date() if until else None)
+    click.echo(f'{created} transação(ões) recorrente(s) gerada(s).')
+
+
+search_cli = AppGroup('search', help='Índice de busca de transações.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search_command():
+    """Cria o índice de busca, se faltar, e o repopula a partir das transações."""
+    from app import db
+    from app.search import install_search_index
+    install_search_index(rebuild=True)
+    db.session.commit()
+    click.echo('Índice de busca reconstruído.')
+
+
+perf_cli = AppGroup('perf', help='Diagnóstico de desempenho das consultas.')
+
+
+def _explain(statement):
+    """Plano de execução de uma consulta (SQLite ou PostgreSQL) como lista de linhas."""
+    from app import db
+    connection = db.session.connection()
+    compiled = statement.compile(dialect=connection.dialect)
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled),
+                                          tuple(compiled.params[k] for k in compiled.positiontup))
+        return [row[-1] for row in rows]
+    # Em tabelas pequenas o PostgreSQL prefere Seq Scan; desligamos para ver se há índice utilizável
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), compiled.params)
+    return [row[0] for row in rows]
+
+
+def _uses_index(plan):
+    text = ' '.join(plan).upper()
+    return 'INDEX' in text and 'SEQ SCAN' not in text
+
+
+@perf_cli.command('explain')
+@click.option('--user-id', type=int, default=1)
+@click.option('--year', type=int, default=None)
+@click.option('--month', type=int, default=None)
+def explain_command(user_id, year, month):
+    """Verifica se as consultas do dashboard e dos relatórios usam índices."""
+    from datetime import datetime
+    from app import db
+    from app.aggregates import month_transactions_query
+    from app.models import Transaction, MonthlySummary
+    from sqlalchemy import func
+
+    now = datetime.now()
+    year = year or now.year
+    month = month or now.month
+    queries = {
+        'transações do mês (dashboard/relatórios)': month_transactions_query(user_id, year, month).statement,
+        'categorias do usuário': db.session.query(Transaction.category).filter(
+            Transaction.user_id == user_id).distinct().statement,
+        'totais do mês (rollup)': db.session.query(MonthlySummary.type, func.sum(MonthlySummary.total_cents)).filter(
+            MonthlySummary.user_id == user_id, MonthlySummary.year == year,
+            MonthlySummary.month == month).group_by(MonthlySummary.type).statement,
+    }
+
+    failures = 0
+    for name, statement in queries.items():
+        plan = _explain(statement)
+        ok = _uses_index(plan)
+        failures += not ok
+        click.echo(f"[{'OK' if ok else 'SEM ÍNDICE'}] {name}")
+        for line in plan:
+            click.echo(f'    {line}')
+    db.session.rollback()
+    if failures:
+        raise SystemExit(1)
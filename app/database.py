@@ -0,0 +1,28 @@
+from sqlalchemy import event
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """Executa os PRAGMAs numa conexão sqlite3 recém-aberta."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """Aplica SQLITE_PRAGMAS a cada conexão dos bancos SQLite, primário e réplica (as opções do pool vêm do Config)."""
+    from app import db
+
+    if not app.config.get('SQLITE_TUNING'):
+        return
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+    def _set_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    for engine in engines:
+        event.listen(engine, 'connect', _set_pragmas)
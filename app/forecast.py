@@ -0,0 +1,185 @@
+from datetime import date
+
+import numpy as np
+
+from app import db, cache
+from app.models import RecurringRule, Invoice, MonthlySummary, from_cents
+from app.aggregates import data_version
+from app.recurring import next_occurrence
+from sqlalchemy import func
+
+# Histórico considerado (5 anos) e meses da média móvel
+HISTORY_MONTHS = 60
+MOVING_AVERAGE_MONTHS = 3
+MAX_FORECAST_MONTHS = 24
+# Peso da média sazonal (mesmo mês em anos anteriores) frente à média móvel
+SEASONAL_WEIGHT = 0.5
+
+
+def _month_index(year, month):
+    return year * 12 + month - 1
+
+
+def _from_month_index(index):
+    return index // 12, index % 12 + 1
+
+
+def _monthly_series(user_id, first_index, span):
+    """Série mensal por (tipo, categoria) numa única consulta agrupada ao rollup.
+
+    Retorna (chaves, matriz [séries x `span` meses a partir de first_index],
+    saldo acumulado de todos os meses em centavos).
+    """
+    rows = db.session.query(
+        MonthlySummary.year, MonthlySummary.month, MonthlySummary.type, MonthlySummary.category,
+        func.sum(MonthlySummary.total_cents)
+    ).filter(MonthlySummary.user_id == user_id).group_by(
+        MonthlySummary.year, MonthlySummary.month, MonthlySummary.type, MonthlySummary.category
+    ).all()
+    if not rows:
+        return [], np.zeros((0, span)), 0
+
+    years, months, types, categories, totals = zip(*rows)
+    totals = np.asarray(totals, dtype=np.float64)
+    is_income = np.asarray(types) == 'income'
+    balance = int(totals[is_income].sum() - totals[~is_income].sum())
+
+    keys = np.array([f'{t}\x1f{c}' for t, c in zip(types, categories)])
+    series, inverse = np.unique(keys, return_inverse=True)
+    positions = np.asarray(years, dtype=np.int64) * 12 + np.asarray(months, dtype=np.int64) - 1 - first_index
+    inside = (positions >= 0) & (positions < span)
+    matrix = np.bincount(inverse[inside] * span + positions[inside], weights=totals[inside],
+                         minlength=len(series) * span).reshape(len(series), span)
+    return [tuple(key.split('\x1f')) for key in series], matrix, balance
+
+
+def _rule_series(rules, first_index, span, keys):
+    """Ocorrências das regras recorrentes por mês, nas mesmas séries de `keys`.
+
+    Retorna (geradas, futuras): centavos já lançados como transações (antes
+    de next_date) e os que ainda serão gerados pelas regras ativas.
+    """
+    last_day = date(*_from_month_index(first_index + span), 1)
+    index = {key: i for i, key in enumerate(keys)}
+    generated = np.zeros((len(keys), span))
+    upcoming = np.zeros((len(keys), span))
+    for rule in rules:
+        key = (rule.type, rule.category or '')
+        if key not in index:
+            index[key] = len(keys)
+            keys.append(key)
+            generated = np.vstack([generated, np.zeros(span)])
+            upcoming = np.vstack([upcoming, np.zeros(span)])
+        dates = []
+        current = rule.start_date
+        while current < last_day and (rule.end_date is None or current <= rule.end_date):
+            dates.append(current)
+            current = next_occurrence(rule.frequency, current, rule.start_date.day)
+        positions = np.fromiter((_month_index(d.year, d.month) - first_index for d in dates),
+                                dtype=np.int64, count=len(dates))
+        is_past = np.fromiter((d < rule.next_date for d in dates), dtype=bool, count=len(dates))
+        inside = (positions >= 0) & (positions < span)
+        generated[index[key]] += np.bincount(positions[inside & is_past], minlength=span) * rule.amount_cents
+        if rule.active:
+            upcoming[index[key]] += np.bincount(positions[inside & ~is_past], minlength=span) * rule.amount_cents
+    return generated, upcoming
+
+
+def _project_history(history, first_index, first_future, horizon):
+    """Projeção vetorizada: média móvel dos últimos meses combinada à média sazonal."""
+    months = history.shape[1]
+    observed_months = np.flatnonzero(history.any(axis=0))
+    started = observed_months[0] if len(observed_months) else months
+    # Meses anteriores ao primeiro lançamento do usuário não contam nas médias
+    recent = history[:, max(started, months - MOVING_AVERAGE_MONTHS):]
+    moving = recent.mean(axis=1) if recent.shape[1] else np.zeros(len(history))
+
+    calendar = (first_index + np.arange(months)) % 12
+    observed = np.arange(months) >= started
+    seasonal_mask = (calendar[None, :] == np.arange(12)[:, None]) & observed[None, :]  # [12 x meses]
+    seasonal_counts = seasonal_mask.sum(axis=1)
+    seasonal = history @ seasonal_mask.T / np.maximum(seasonal_counts, 1)  # [séries x 12]
+
+    future_calendar = (first_future + np.arange(horizon)) % 12
+    has_season = seasonal_counts[future_calendar] > 0
+    return np.where(has_season[None, :],
+                    (1 - SEASONAL_WEIGHT) * moving[:, None] + SEASONAL_WEIGHT * seasonal[:, future_calendar],
+                    moving[:, None])
+
+
+def _invoices_due(user_id, first_future, horizon):
+    """Total das faturas já conhecidas por mês de vencimento (centavos)."""
+    rows = db.session.query(Invoice.due_date, Invoice.total_cents).filter(
+        Invoice.user_id == user_id,
+        Invoice.due_date >= date(*_from_month_index(first_future), 1)
+    ).all()
+    offsets = np.fromiter((_month_index(d.year, d.month) - first_future for d, _ in rows), dtype=np.int64,
+                          count=len(rows))
+    cents = np.fromiter((c for _, c in rows), dtype=np.float64, count=len(rows))
+    keep = offsets < horizon
+    return np.bincount(offsets[keep], weights=cents[keep], minlength=horizon)
+
+
+def compute_forecast(user_id, months, today):
+    current = _month_index(today.year, today.month)
+    first_index = current - HISTORY_MONTHS
+    first_future = current + 1
+    span = HISTORY_MONTHS + 1 + months
+
+    keys, series, balance = _monthly_series(user_id, first_index, span)
+    rules = RecurringRule.query.filter_by(user_id=user_id).all()
+    generated, upcoming = _rule_series(rules, first_index, span, keys)
+    series = np.vstack([series, np.zeros((len(keys) - len(series), span))])
+
+    # Ocorrências já geradas saem do histórico (entram pelas regras); o mês corrente, incompleto, fica de fora
+    history = np.clip(series - generated, 0, None)[:, :HISTORY_MONTHS]
+    projection = _project_history(history, first_index, first_future, months)
+    projection = np.round(projection + upcoming[:, HISTORY_MONTHS + 1:])
+
+    is_income = np.array([type_ == 'income' for type_, _ in keys], dtype=bool)
+    income = projection[is_income].sum(axis=0)
+    expense = projection[~is_income].sum(axis=0)
+    net = income - expense
+    balances = balance + np.cumsum(net)
+    invoices = _invoices_due(user_id, first_future, months)
+
+    periods = [_from_month_index(first_future + i) for i in range(months)]
+    return {
+        'months': months,
+        'starting_balance': from_cents(balance),
+        'periods': [{
+            'year': year,
+            'month': month,
+            'income': from_cents(int(income[i])),
+            'expense': from_cents(int(expense[i])),
+            'net': from_cents(int(net[i])),
+            'balance': from_cents(int(balances[i])),
+            'invoices_due': from_cents(int(invoices[i])),
+        } for i, (year, month) in enumerate(periods)],
+        'categories': [{
+            'type': type_,
+            'category': category or None,
+            'amounts': [from_cents(int(cents)) for cents in projection[i]],
+        } for i, (type_, category) in sorted(enumerate(keys), key=lambda item: item[1])
+            if projection[i].any()],
+    }
+
+
+def forecast(user_id, months=6, today=None):
+    """Projeção de fluxo de caixa dos próximos `months` meses, por categoria.
+
+    Combina média móvel e média sazonal do histórico mensal (uma consulta
+    agrupada ao rollup, processada com numpy), as regras recorrentes ativas
+    e as faturas de cartão a vencer. `invoices_due` é informativo: as compras
+    no cartão já entram nas despesas do mês da compra. O resultado é
+    memoizado por versão dos dados do usuário.
+    """
+    if not 1 <= months <= MAX_FORECAST_MONTHS:
+        raise ValueError(f'O número de meses deve estar entre 1 e {MAX_FORECAST_MONTHS}.')
+    today = today or date.today()
+    key = f'forecast:{user_id}:{data_version(user_id)}:{months}:{today.isoformat()}'
+    result = cache.get(key)
+    if result is None:
+        result = compute_forecast(user_id, months, today)
+        cache.set(key, result)
+    return result
@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from app import db
+from app.models import Transaction, to_cents
+from app.aggregates import apply_summary_deltas, summary_key
+from app.invoices import CardLookup, add_invoice_delta, apply_invoice_deltas
+from app.cache import get_user_cards
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+IMPORT_FORMATS = ('csv', 'json', 'ofx')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S')
+
+transaction_table = Transaction.__table__
+
+
+# --- Leitura dos formatos (geradores de (linha, dict)) ---
+
+def parse_csv(stream):
+    """Lê um CSV com cabeçalho (type, amount, description, payment_method, category, date)."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def parse_json(stream):
+    """Lê uma lista JSON de objetos ou NDJSON (um objeto por linha)."""
+    text = stream.read().decode('utf-8-sig')
+    if text.lstrip().startswith('['):
+        for row_number, row in enumerate(json.loads(text), start=1):
+            yield row_number, row
+        return
+    for row_number, line in enumerate(text.splitlines(), start=1):
+        if line.strip():
+            try:
+                yield row_number, json.loads(line)
+            except ValueError:
+                yield row_number, None
+
+
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def parse_ofx(stream):
+    """Lê os blocos <STMTTRN> de um extrato OFX (SGML ou XML)."""
+    text = stream.read().decode('latin-1')
+    for row_number, block in enumerate(re.findall(r'<STMTTRN>(.*?)</STMTTRN>', text, re.S | re.I), start=1):
+        fields = {name.upper(): value.strip() for name, value in OFX_FIELD.findall(block)}
+        amount = fields.get('TRNAMT', '')
+        yield row_number, {
+            'type': 'expense' if amount.startswith('-') else 'income',
+            'amount': amount.lstrip('-+'),
+            'description': fields.get('MEMO') or fields.get('NAME'),
+            'date': fields.get('DTPOSTED', '')[:8],
+        }
+
+
+PARSERS = {'csv': parse_csv, 'json': parse_json, 'ofx': parse_ofx}
+
+
+# --- Validação ---
+
+def parse_date(value):
+    if not value:
+        return datetime.utcnow()
+    if isinstance(value, str) and re.fullmatch(r'\d{8}', value):
+        return datetime.strptime(value, '%Y%m%d')
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (ValueError, TypeError):
+            continue
+    return datetime.fromisoformat(value)
+
+
+def validate_row(raw, user_id, default_payment_method=None):
+    """Normaliza uma linha importada; levanta ValueError com a mensagem do erro."""
+    if not isinstance(raw, dict):
+        raise ValueError('Linha inválida.')
+    # JSON aceita números, listas etc. em qualquer campo: os de texto precisam ser strings
+    for field in ('type', 'description', 'payment_method', 'category'):
+        if raw.get(field) is not None and not isinstance(raw[field], str):
+            raise ValueError(f'O campo {field} deve ser um texto.')
+    type_ = (raw.get('type') or '').strip().lower()
+    if type_ not in ('income', 'expense'):
+        raise ValueError("O tipo deve ser 'income' ou 'expense'.")
+    try:
+        amount_cents = to_cents(raw.get('amount'))
+    except ValueError:
+        raise ValueError('O valor da transação deve ser um número válido.')
+    try:
+        date = parse_date(raw.get('date'))
+    except (ValueError, TypeError):
+        raise ValueError('Data inválida.')
+
+    row = {
+        'type': type_,
+        'amount_cents': amount_cents,
+        'description': (raw.get('description') or '')[:200],
+        'payment_method': raw.get('payment_method') or default_payment_method,
+        'category': raw.get('category') or None,
+        'date': date,
+        'user_id': user_id,
+    }
+    for field in ('payment_method', 'category'):
+        if row[field] and len(row[field]) > 50:
+            raise ValueError(f'O campo {field} excede 50 caracteres.')
+    return row
+
+
+# --- Importação ---
+
+def import_transactions(user_id, stream, fmt, batch_size=DEFAULT_BATCH_SIZE, dry_run=False,
+                        skip_invalid=False, default_payment_method=None):
+    """Valida e insere as linhas em lotes, numa única transação.
+
+    Se houver erros e skip_invalid for falso, nada é gravado. Em dry_run
+    as linhas são apenas validadas, sem nenhuma escrita.
+    """
+    if fmt not in PARSERS:
+        raise ValueError(f"Formato inválido (use {', '.join(IMPORT_FORMATS)}).")
+
+    started = time.perf_counter()
+    errors = []
+    error_count = 0
+    valid = 0
+    batch = []
+    deltas = defaultdict(lambda: [0, 0])
+    card_ids = {card.name: card.id for card in get_user_cards(user_id)}
+    connection = db.session.connection()
+    # Só as faturas dos ciclos que receberam compras, somadas como o rollup mensal
+    invoice_cards = CardLookup(connection)
+    invoice_deltas = defaultdict(lambda: [0, 0])
+
+    def flush_batch():
+        if batch and not dry_run:
+            connection.execute(transaction_table.insert(), batch)
+        batch.clear()
+
+    try:
+        for row_number, raw in PARSERS[fmt](stream):
+            try:
+                row = validate_row(raw, user_id, default_payment_method)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': row_number, 'error': str(e)})
+                continue
+            valid += 1
+            row['card_id'] = card_ids.get(row['payment_method'])
+            if row['card_id']:
+                row['payment_method'] = None
+            key = summary_key(user_id, row['date'], row['type'], row['category'], row['payment_method'],
+                              row['card_id'])
+            deltas[key][0] += row['amount_cents']
+            deltas[key][1] += 1
+            add_invoice_delta(invoice_cards, invoice_deltas, row)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush_batch()
+        flush_batch()
+
+        committed = not dry_run and (skip_invalid or not error_count)
+        if committed:
+            apply_summary_deltas(connection, deltas)
+            apply_invoice_deltas(connection, invoice_cards.by_id, invoice_deltas)
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    return {
+        'dry_run': dry_run,
+        'committed': committed,
+        'valid_rows': valid,
+        'imported': valid if committed else 0,
+        'error_count': error_count,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 4),
+        'rows_per_second': round((valid + error_count) / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,271 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date
+
+from app import db
+from app.models import Transaction, Card, Invoice
+from sqlalchemy import event, and_, func, extract, inspect, select
+
+invoice_table = Invoice.__table__
+card_table = Card.__table__
+
+
+# --- Ciclos de faturamento ---
+
+def _clamp_day(year, month, day):
+    return date(year, month, min(day, monthrange(year, month)[1]))
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def billing_cycle(closing_day, when):
+    """(ano, mês) de fechamento da fatura em que cai uma compra feita em `when`.
+
+    Compras até o dia de fechamento (inclusive) entram na fatura que fecha no
+    próprio mês; depois dele, na fatura do mês seguinte.
+    """
+    if when.day <= _clamp_day(when.year, when.month, closing_day).day:
+        return when.year, when.month
+    return _next_month(when.year, when.month)
+
+
+def parse_closing_day(value):
+    """Dia de fechamento opcional do cartão; vazio significa usar o padrão (7 dias antes do vencimento)."""
+    if value in (None, ''):
+        return None
+    closing_day = int(value)
+    if not 1 <= closing_day <= 31:
+        raise ValueError('Dia de fechamento inválido.')
+    return closing_day
+
+def cycle_dates(closing_day, due_day, year, month):
+    """Datas de fechamento e vencimento da fatura do ciclo (year, month)."""
+    closing = _clamp_day(year, month, closing_day)
+    if due_day > closing_day:
+        due = _clamp_day(year, month, due_day)
+    else:
+        due = _clamp_day(*_next_month(year, month), due_day)
+    return closing, due
+
+
+# --- Manutenção incremental ---
+
+def apply_invoice_deltas(connection, cards, deltas):
+    """Aplica {(card_id, ano, mês): [centavos, count]} às faturas, criando as que faltam."""
+    today = date.today()
+    for (card_id, year, month), (cents, count) in deltas.items():
+        if not cents and not count:
+            continue
+        where = and_(invoice_table.c.card_id == card_id,
+                     invoice_table.c.year == year,
+                     invoice_table.c.month == month)
+        result = connection.execute(invoice_table.update().where(where).values(
+            total_cents=invoice_table.c.total_cents + cents,
+            count=invoice_table.c.count + count
+        ))
+        if result.rowcount == 0:
+            card = cards[card_id]
+            closing, due = cycle_dates(card['closing_day'], card['due_day'], year, month)
+            connection.execute(invoice_table.insert().values(
+                user_id=card['user_id'], card_id=card_id, year=year, month=month,
+                closing_date=closing, due_date=due, total_cents=cents, count=count,
+                status='open' if closing >= today else 'closed'
+            ))
+    if deltas:
+        card_ids = {key[0] for key in deltas}
+        connection.execute(invoice_table.delete().where(
+            invoice_table.c.card_id.in_(card_ids),
+            invoice_table.c.count <= 0
+        ))
+
+
+class CardLookup:
+    """Ciclo de faturamento de cada cartão, lido uma vez por flush."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.by_id = {}
+
+    def get(self, card_id):
+        if card_id not in self.by_id:
+            row = self.connection.execute(
+                select(card_table.c.id, card_table.c.user_id, card_table.c.due_day, card_table.c.closing_day)
+                .where(card_table.c.id == card_id)
+            ).first()
+            self.by_id[card_id] = None if row is None else {
+                'id': row.id, 'user_id': row.user_id, 'due_day': row.due_day,
+                'closing_day': Card.closing_day_for(row.due_day, row.closing_day)
+            }
+        return self.by_id[card_id]
+
+
+TRACKED_FIELDS = ('date', 'type', 'card_id', 'amount_cents')
+
+
+@event.listens_for(db.session, 'before_flush')
+def _delete_card_invoices(session, flush_context, instances):
+    # As faturas saem antes do cartão para não violar a chave estrangeira
+    card_ids = [obj.id for obj in session.deleted if isinstance(obj, Card)]
+    if card_ids:
+        session.connection().execute(invoice_table.delete().where(invoice_table.c.card_id.in_(card_ids)))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_invoice_changes(session, flush_context):
+    from app.aggregates import _old_value  # app.aggregates importa este módulo
+
+    cards = CardLookup(session.connection())
+    deltas = defaultdict(lambda: [0, 0])
+
+    def add(when, type_, card_id, cents, sign):
+        if type_ != 'expense' or when is None or not card_id:
+            return
+        card = cards.get(card_id)
+        if card is None:
+            return
+        key = (card['id'],) + billing_cycle(card['closing_day'], when)
+        deltas[key][0] += sign * cents
+        deltas[key][1] += sign
+
+    rebuild_cards = []
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            add(obj.date, obj.type, obj.card_id, obj.amount_cents, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            add(obj.date, obj.type, obj.card_id, obj.amount_cents, -1)
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            state = inspect(obj)
+            add(*(_old_value(state, attr) for attr in TRACKED_FIELDS), -1)
+            add(obj.date, obj.type, obj.card_id, obj.amount_cents, 1)
+        elif isinstance(obj, Card) and session.is_modified(obj):
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in ('due_day', 'closing_day')):
+                rebuild_cards.append(obj)
+
+    apply_invoice_deltas(session.connection(), cards.by_id, deltas)
+    for card in rebuild_cards:
+        rebuild_card_invoices(session.connection(), card)
+
+
+def add_invoice_delta(cards, deltas, row):
+    """Soma em `deltas` a despesa em cartão de `row` (dict com as colunas de Transaction), no seu ciclo."""
+    if row['type'] != 'expense' or not row.get('card_id'):
+        return
+    card = cards.get(row['card_id'])
+    if card is None:
+        return
+    key = (card['id'],) + billing_cycle(card['closing_day'], row['date'])
+    deltas[key][0] += row['amount_cents']
+    deltas[key][1] += 1
+
+
+def add_to_invoices(connection, rows):
+    """Soma às faturas as despesas em cartão inseridas em massa (dicts com as colunas de Transaction)."""
+    cards = CardLookup(connection)
+    deltas = defaultdict(lambda: [0, 0])
+    for row in rows:
+        add_invoice_delta(cards, deltas, row)
+    apply_invoice_deltas(connection, cards.by_id, deltas)
+
+
+# --- Reconstrução e leitura ---
+
+def _card_expense_days(connection, card_id, extra_conditions=()):
+    """Despesas de um cartão agrupadas por dia (ano, mês, dia) -> (centavos, count), pelo índice (card_id, date)."""
+    t_year = extract('year', Transaction.date)
+    t_month = extract('month', Transaction.date)
+    t_day = extract('day', Transaction.date)
+    return connection.execute(
+        select(t_year, t_month, t_day, func.sum(Transaction.amount_cents), func.count(Transaction.id))
+        .where(Transaction.card_id == card_id,
+               Transaction.type == 'expense',
+               Transaction.date.isnot(None),
+               *extra_conditions)
+        .group_by(t_year, t_month, t_day)
+    ).all()
+
+
+def card_cycle_deltas(connection, card, sign=1, extra_conditions=()):
+    """Totais por ciclo de um cartão, a partir das despesas agrupadas por dia."""
+    closing_day = card.billing_closing_day
+    deltas = defaultdict(lambda: [0, 0])
+    for year, month, day, cents, count in _card_expense_days(connection, card.id, extra_conditions):
+        key = (card.id,) + billing_cycle(closing_day, date(int(year), int(month), int(day)))
+        deltas[key][0] += sign * int(cents)
+        deltas[key][1] += sign * count
+    return deltas
+
+
+def _card_info(card):
+    return {card.id: {'id': card.id, 'user_id': card.user_id, 'due_day': card.due_day,
+                      'closing_day': card.billing_closing_day}}
+
+
+def rebuild_card_invoices(connection, card):
+    """Recalcula todas as faturas de um cartão (usado quando o ciclo muda)."""
+    connection.execute(invoice_table.delete().where(invoice_table.c.card_id == card.id))
+    apply_invoice_deltas(connection, _card_info(card), card_cycle_deltas(connection, card))
+
+
+def rebuild_user_invoices(user_id, connection=None):
+    """Recalcula as faturas de todos os cartões do usuário (importações e migrações)."""
+    connection = connection or db.session.connection()
+    for card in Card.query.filter_by(user_id=user_id).all():
+        rebuild_card_invoices(connection, card)
+
+
+def remove_from_invoices(connection, user_id, transaction_ids):
+    """Desconta das faturas as transações que serão apagadas em massa."""
+    deltas = defaultdict(lambda: [0, 0])
+    cards = {}
+    for card in Card.query.filter_by(user_id=user_id).all():
+        cards.update(_card_info(card))
+        for key, (cents, count) in card_cycle_deltas(connection, card, -1,
+                                                     (Transaction.id.in_(transaction_ids),)).items():
+            deltas[key][0] += cents
+            deltas[key][1] += count
+    apply_invoice_deltas(connection, cards, deltas)
+
+
+def refresh_invoice_status(user_id=None):
+    """Marca como fechadas as faturas cujo fechamento já passou (job diário, `flask invoices close`).
+
+    As leituras não dependem disso: user_invoices deriva aberta/fechada de
+    closing_date. Devolve o número de faturas fechadas, sem commit.
+    """
+    conditions = [invoice_table.c.status == 'open', invoice_table.c.closing_date < date.today()]
+    if user_id is not None:
+        conditions.append(invoice_table.c.user_id == user_id)
+    return db.session.execute(invoice_table.update().where(*conditions).values(status='closed')).rowcount
+
+
+def user_invoices(user_id, year, month):
+    """Fatura aberta atual e faturas fechadas do ciclo (year, month) de cada cartão, em O(cartões).
+
+    Só leitura (o dashboard vai para a réplica): a situação vem de closing_date
+    comparado a hoje, não da coluna status, atualizada só pelo job de fechamento.
+    """
+    today = date.today()
+    open_invoices = {}
+    for invoice in Invoice.query.filter(Invoice.user_id == user_id, Invoice.closing_date >= today) \
+                                .order_by(Invoice.closing_date).all():
+        open_invoices.setdefault(invoice.card_id, invoice)
+    closed = Invoice.query.filter(Invoice.user_id == user_id, Invoice.closing_date < today,
+                                  Invoice.year == year, Invoice.month == month).all()
+
+    def as_dict(invoice):
+        return {
+            'card_id': invoice.card_id,
+            'year': invoice.year,
+            'month': invoice.month,
+            'amount': invoice.amount,
+            'closing_date': invoice.closing_date,
+            'due_date': invoice.due_date,
+            'status': 'open' if invoice.closing_date >= today else 'closed',
+        }
+
+    return {'open': [as_dict(i) for i in open_invoices.values()], 'closed': [as_dict(i) for i in closed]}
@@ -0,0 +1,280 @@
+import hmac
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, abort, current_app, g, request
+
+# Limites (em segundos) dos buckets dos histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'meubolso_'
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Latência das requisições por endpoint.'),
+    'http_requests_in_flight': ('gauge', 'Requisições em andamento.'),
+    'db_pool_checkout_wait_seconds': ('histogram', 'Espera para obter uma conexão do pool.'),
+    'db_pool_checked_out': ('gauge', 'Conexões do pool em uso.'),
+    'password_check_seconds': ('histogram', 'Tempo de verificação do hash de senha no login.'),
+    'login_throttled_total': ('counter', 'Tentativas de login recusadas pelo limite, por escopo.'),
+    'transaction_writes_total': ('counter', 'Linhas gravadas na tabela transaction, por operação.'),
+    'cache_requests_total': ('counter', 'Consultas ao cache da aplicação, por resultado.'),
+}
+
+
+class Metrics:
+    """Contadores, gauges e histogramas do processo, exportados no formato texto do Prometheus.
+
+    Com METRICS_DIR cada worker do gunicorn grava periodicamente um snapshot
+    em METRICS_DIR/<pid>.json e o /metrics de qualquer worker soma os de
+    todos os processos vivos; sem ele, só o processo atual é exportado.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.engine = None
+        self.flush_interval = 1.0
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(float)
+        self.gauges = defaultdict(float)
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        if self.enabled:
+            with self._lock:
+                self.counters[self._key(name, labels)] += value
+
+    def gauge_add(self, name, value, **labels):
+        if self.enabled:
+            with self._lock:
+                self.gauges[self._key(name, labels)] += value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            buckets = histogram[0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # --- Agregação entre processos ---
+
+    def snapshot(self):
+        from app import cache
+        cache_stats = cache.stats()
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[n, list(l), v] for (n, l), v in self.counters.items()]
+                            + [['cache_requests_total', [['result', 'hit']], cache_stats['hits']],
+                               ['cache_requests_total', [['result', 'miss']], cache_stats['misses']]],
+                'gauges': [[n, list(l), v] for (n, l), v in self.gauges.items()] + self._pool_gauges(),
+                'histograms': [[n, list(l), h[0], h[1], h[2]] for (n, l), h in self.histograms.items()],
+            }
+
+    def _pool_gauges(self):
+        # engine.pool lido a cada coleta: engine.dispose() (gunicorn.conf.py) troca o pool
+        pool = getattr(self.engine, 'pool', None)
+        if not hasattr(pool, 'checkedout'):
+            return []
+        return [['db_pool_checked_out', [], pool.checkedout()]]
+
+    def flush(self, force=False):
+        """Grava o snapshot deste processo (no máximo a cada flush_interval segundos)."""
+        now = time.monotonic()
+        if not self.directory or (not force and now - self._last_flush < self.flush_interval):
+            return
+        self._last_flush = now
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Snapshots de todos os processos vivos (o deste processo é sempre o atual)."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json'):
+                    continue
+                pid = int(filename[:-5])
+                if pid == os.getpid():
+                    continue
+                if not _alive(pid):
+                    # Worker encerrado: seus contadores saem da soma, como num reinício do processo
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def render(self):
+        """Métricas somadas de todos os processos, no formato texto do Prometheus."""
+        counters, gauges, histograms = defaultdict(float), defaultdict(float), {}
+        for snapshot in self.collect():
+            for name, labels, value in snapshot['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, value in snapshot['gauges']:
+                gauges[name, tuple(map(tuple, labels))] += value
+            for name, labels, buckets, total, count in snapshot['histograms']:
+                merged = histograms.setdefault((name, tuple(map(tuple, labels))),
+                                               [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            lines.append(f'# HELP {PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+            if kind == 'histogram':
+                for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, value in zip(LATENCY_BUCKETS, buckets):
+                        cumulative += value
+                        lines.append(f'{PREFIX}{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_bucket{_labels(labels, le="+Inf")} {count}')
+                    lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total}')
+                    lines.append(f'{PREFIX}{name}_count{_labels(labels)} {count}')
+            else:
+                values = counters if kind == 'counter' else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        value = int(value) if value == int(value) else value
+                        lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+metrics = Metrics()
+
+
+# --- Coleta ---
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    metrics.gauge_add('http_requests_in_flight', 1)
+
+
+def _end_request(exc=None):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    metrics.gauge_add('http_requests_in_flight', -1)
+    metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                    endpoint=request.endpoint or 'unmatched', method=request.method)
+    metrics.flush()
+
+
+def _count_transaction_writes(conn, clauseelement, multiparams, params, execution_options, result):
+    table = getattr(clauseelement, 'table', None)
+    if table is None or table.name != 'transaction' or not clauseelement.is_dml:
+        return
+    if clauseelement.is_insert:
+        metrics.inc('transaction_writes_total', len(multiparams) or 1, operation='insert')
+    else:
+        operation = 'update' if clauseelement.is_update else 'delete'
+        metrics.inc('transaction_writes_total', max(result.rowcount, 0), operation=operation)
+
+
+def _time_pool_checkout(engine):
+    # Os eventos do pool só avisam depois do checkout; a espera é medida em
+    # engine.raw_connection, que busca engine.pool a cada chamada e por isso
+    # continua valendo depois de um engine.dispose()
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def export_metrics():
+    # Só exportado com METRICS_TOKEN, pedido como "Authorization: Bearer <token>"
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Liga a coleta de métricas (METRICS_ENABLED) e registra o /metrics."""
+    from sqlalchemy import event
+    from app import db
+
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    metrics.enabled = True
+    metrics.directory = app.config.get('METRICS_DIR')
+    metrics.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+    if metrics.directory:
+        os.makedirs(metrics.directory, exist_ok=True)
+    with app.app_context():
+        event.listen(db.engine, 'after_execute', _count_transaction_writes)
+        metrics.engine = db.engine
+        _time_pool_checkout(db.engine)
+    app.before_request(_start_request)
+    app.teardown_request(_end_request)
+    app.register_blueprint(metrics_bp)
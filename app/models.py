@@ -1,7 +1,25 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.metrics import metrics
+from app.passwords import hasher
 from flask_login import UserMixin
+from sqlalchemy import select, func
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+def to_cents(value):
+    """Converte um valor em reais (número ou texto, com ponto ou vírgula) para centavos inteiros."""
+    try:
+        cents = (Decimal(str(value).strip().replace(',', '.')) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        return int(cents)
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f'Valor inválido: {value!r}')
+
+
+def from_cents(cents):
+    """Converte centavos inteiros para reais (float, apenas para exibição/JSON)."""
+    return None if cents is None else int(cents) / 100
 
 # A classe User agora herda de UserMixin para que o Flask-Login possa gerenciar o usuário.
 class User(UserMixin, db.Model):
@@ -9,30 +27,73 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(256))
+    # Incrementado a cada alteração de transações ou cartões (usado em ETags e caches)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     transactions = db.relationship('Transaction', backref='author', lazy='dynamic')
     cards = db.relationship('Card', backref='owner', lazy='dynamic')
 
     def __repr__(self):
         return f'<User {self.username}>'
 
-    # Método para definir a senha do usuário
+    # Método para definir a senha do usuário (método e custo em PASSWORD_HASH_METHOD)
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
-    # Método para verificar a senha do usuário
+    # Método para verificar a senha do usuário (no pool limitado de app.passwords)
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        with metrics.timer('password_check_seconds'):
+            return hasher.verify(self.password_hash, password)
 
 # Tabela de transações financeiras
 class Transaction(db.Model):
+    # Índices compostos usados pelos filtros por usuário (período, cartão e categoria)
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        db.Index('ix_transaction_user_payment_method', 'user_id', 'payment_method'),
+        db.Index('ix_transaction_user_category', 'user_id', 'category'),
+        db.Index('ix_transaction_card_date', 'card_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(10), nullable=False) # 'income' ou 'expense'
-    amount = db.Column(db.Float, nullable=False)
+    # Valor em centavos inteiros; `amount` expõe o valor em reais
+    amount_cents = db.Column(db.BigInteger, nullable=False)
     description = db.Column(db.String(200))
-    payment_method = db.Column(db.String(50))
+    # Formas de pagamento simples (Dinheiro, PIX...); compras em cartão cadastrado usam card_id
+    _payment_method = db.Column('payment_method', db.String(50))
+    card_id = db.Column(db.Integer, db.ForeignKey('card.id'), nullable=True)
     category = db.Column(db.String(50))
     date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    card = db.relationship('Card')
+
+    @hybrid_property
+    def amount(self):
+        return from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+
+    @amount.expression
+    def amount(cls):
+        return cls.amount_cents / 100.0
+
+    @hybrid_property
+    def payment_method(self):
+        return self.card.name if self.card is not None else self._payment_method
+
+    @payment_method.setter
+    def payment_method(self, value):
+        # Um método simples desvincula o cartão; None mantém o card_id definido à parte
+        self._payment_method = value
+        if value is not None:
+            self.card_id = None
+
+    @payment_method.expression
+    def payment_method(cls):
+        card_name = select(Card.name).where(Card.id == cls.card_id).scalar_subquery()
+        return func.coalesce(cls._payment_method, card_name)
 
     def __repr__(self):
         return f'<Transaction {self.description}>'
@@ -42,7 +103,122 @@ class Card(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     due_day = db.Column(db.Integer, nullable=False)
+    # Dia de fechamento da fatura; sem valor, assume 7 dias antes do vencimento
+    closing_day = db.Column(db.Integer, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    @staticmethod
+    def closing_day_for(due_day, closing_day=None):
+        if closing_day:
+            return closing_day
+        return due_day - 7 if due_day > 7 else due_day + 23
+
+    @property
+    def billing_closing_day(self):
+        return Card.closing_day_for(self.due_day, self.closing_day)
+
     def __repr__(self):
         return f'<Card {self.name}>'
+
+# Regra de transação recorrente (salário, assinaturas...); as ocorrências são geradas pelo agendador
+class RecurringRule(db.Model):
+    __table_args__ = (
+        db.Index('ix_recurring_rule_active_next_date', 'active', 'next_date'),
+        db.Index('ix_recurring_rule_user_next_date', 'user_id', 'next_date'),
+    )
+
+    FREQUENCIES = ('weekly', 'monthly', 'yearly')
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(10), nullable=False) # 'income' ou 'expense'
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    description = db.Column(db.String(200))
+    category = db.Column(db.String(50))
+    payment_method = db.Column(db.String(50))
+    card_id = db.Column(db.Integer, db.ForeignKey('card.id'), nullable=True)
+    frequency = db.Column(db.String(10), nullable=False, default='monthly')
+    start_date = db.Column(db.Date, nullable=False)
+    # Próxima ocorrência ainda não gerada; avança a cada execução do agendador
+    next_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    card = db.relationship('Card')
+
+    @hybrid_property
+    def amount(self):
+        return from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+
+    @amount.expression
+    def amount(cls):
+        return cls.amount_cents / 100.0
+
+    def __repr__(self):
+        return f'<RecurringRule {self.description} {self.frequency}>'
+
+# Orçamento mensal por categoria; spent_cents é um total corrente mantido pelos deltas do rollup
+class Budget(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'category', name='uq_budget_user_month_category'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    limit_cents = db.Column(db.BigInteger, nullable=False)
+    spent_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    alert = db.Column(db.String(10), nullable=False, default='ok') # 'ok', 'warning' ou 'over'
+
+    def __repr__(self):
+        return f'<Budget {self.category} {self.year}-{self.month:02d}>'
+
+# Fatura de um cartão: um registro por ciclo (ano/mês de fechamento)
+class Invoice(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('card_id', 'year', 'month', name='uq_invoice_card_cycle'),
+        db.Index('ix_invoice_user_status', 'user_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    card_id = db.Column(db.Integer, db.ForeignKey('card.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    closing_date = db.Column(db.Date, nullable=False)
+    due_date = db.Column(db.Date, nullable=False)
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(10), nullable=False, default='open') # 'open' ou 'closed'
+
+    @property
+    def amount(self):
+        return from_cents(self.total_cents)
+
+    def __repr__(self):
+        return f'<Invoice {self.card_id} {self.year}-{self.month:02d}>'
+
+# Tabela de resumo mensal (rollup) mantida incrementalmente a cada escrita em Transaction
+class MonthlySummary(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'type', 'category', 'payment_method',
+                            name='uq_monthly_summary_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    category = db.Column(db.String(50), nullable=False, default='')
+    payment_method = db.Column(db.String(50), nullable=False, default='')
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MonthlySummary {self.user_id} {self.year}-{self.month:02d} {self.type}>'
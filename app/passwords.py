@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """A fila de verificações de senha está cheia; o login deve ser tentado de novo."""
+
+
+class PasswordHasher:
+    """Hash de senhas com método/custo configuráveis e verificação num pool limitado.
+
+    PASSWORD_HASH_METHOD segue o formato do werkzeug ("scrypt:32768:8:1",
+    "pbkdf2:sha256:600000"...). As verificações rodam em no máximo
+    PASSWORD_HASH_WORKERS threads (scrypt e pbkdf2 liberam o GIL) com até
+    PASSWORD_HASH_QUEUE esperando; além disso, HasherBusy. Assim o CPU gasto
+    com hashes por processo fica limitado mesmo sob uma rajada de logins.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self._prefix = None
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self._prefix = None
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        # As threads só nascem na primeira verificação (no worker, não no mestre do --preload)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + app.config.get('PASSWORD_HASH_QUEUE', 8))
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method)
+
+    def verify(self, password_hash, password):
+        if self._executor is None:
+            return check_password_hash(password_hash, password)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._executor.submit(check_password_hash, password_hash, password).result()
+        finally:
+            self._slots.release()
+
+    def needs_rehash(self, password_hash):
+        """True se o hash foi gerado com outro método ou custo que o configurado."""
+        if self._prefix is None:
+            # O werkzeug completa os parâmetros padrão ("scrypt" -> "scrypt:32768:8:1")
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+
+hasher = PasswordHasher()
+
+
+def authenticate(email, password, remote_addr):
+    """Usuário com esse e-mail e senha, ou None; regrava o hash se os parâmetros mudaram.
+
+    Levanta LoginThrottled (app.ratelimit) se o IP ou a conta passaram do
+    limite de tentativas ou se não há vaga para verificar a senha.
+    """
+    from app import db
+    from app.cache import invalidate_user
+    from app.models import User
+    from app.ratelimit import LoginThrottled, login_limiter
+
+    login_limiter.check(remote_addr, email)
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        return None
+    try:
+        if not user.check_password(password):
+            return None
+    except HasherBusy:
+        from app.metrics import metrics
+        metrics.inc('login_throttled_total', scope='hasher')
+        raise LoginThrottled(1)
+    if hasher.needs_rehash(user.password_hash):
+        user.set_password(password)
+        db.session.commit()
+        invalidate_user(user.id)
+    return user
+
+
+def init_app(app):
+    hasher.init_app(app)
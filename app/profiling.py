@@ -0,0 +1,150 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import time
+from collections import Counter
+
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from flask_login import login_required
+
+logger = logging.getLogger(__name__)
+
+# Mesma consulta (sem os literais) repetida a partir desta contagem numa requisição = suspeita de N+1
+N_PLUS_ONE_THRESHOLD = 5
+SLOWEST_STATEMENTS = 3
+PROFILE_LINES = 40
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)')
+
+
+def normalize_statement(statement):
+    """SQL sem literais e com listas IN colapsadas, para agrupar consultas repetidas."""
+    statement = _LITERALS.sub('?', statement)
+    return ' '.join(_IN_LISTS.sub('(...)', statement).split())
+
+
+# --- Contagem de consultas por requisição ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_stats' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'query_stats' in g):
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = g.query_stats
+    stats['count'] += 1
+    stats['db_time'] += elapsed
+    stats['statements'][normalize_statement(statement)] += 1
+    stats['slowest'].append((elapsed, statement))
+    stats['slowest'] = sorted(stats['slowest'], reverse=True)[:SLOWEST_STATEMENTS]
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.query_stats = {'count': 0, 'db_time': 0.0, 'statements': Counter(), 'slowest': []}
+
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    db_ms = stats['db_time'] * 1000
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats["count"]} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+    n_plus_one = [{'statement': statement[:200], 'count': count}
+                  for statement, count in stats['statements'].most_common()
+                  if count >= current_app.config['N_PLUS_ONE_THRESHOLD']]
+    record = {
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total_ms, 2),
+        'queries': stats['count'],
+        'db_ms': round(db_ms, 2),
+        'slowest': [{'ms': round(elapsed * 1000, 2), 'statement': ' '.join(statement.split())[:200]}
+                    for elapsed, statement in stats['slowest']],
+        'n_plus_one': n_plus_one,
+    }
+    slow = total_ms >= current_app.config['SLOW_REQUEST_MS']
+    logger.log(logging.WARNING if slow or n_plus_one else logging.INFO, json.dumps(record, ensure_ascii=False))
+    return response
+
+
+def init_app(app):
+    """Liga a instrumentação de consultas (opt-in, QUERY_INSTRUMENTATION) e o /debug/profile (DEBUG_PROFILE)."""
+    from sqlalchemy import event
+    from app import db
+
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    if app.config.get('QUERY_INSTRUMENTATION'):
+        # app.logger instala o handler padrão do Flask no logger "app", pai deste
+        app.logger
+        logger.setLevel(logging.INFO)
+        with app.app_context():
+            for engine in db.engines.values():  # primário e, se houver, a réplica de leitura
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+    if app.config.get('DEBUG_PROFILE'):
+        app.register_blueprint(debug_bp)
+
+
+# --- Perfil de uma requisição ---
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+
+@debug_bp.route('/profile/<path:target>', methods=['GET'])
+@login_required
+def profile(target):
+    """Executa GET /<target> (com a query string e os cookies atuais) sob o profiler e devolve o relatório.
+
+    Usa o pyinstrument se estiver instalado (?profiler=pyinstrument); senão, cProfile.
+    """
+    app = current_app._get_current_object()
+    use_pyinstrument = request.args.get('profiler') == 'pyinstrument'
+    query_string = {k: v for k, v in request.args.items() if k != 'profiler'}
+    # A requisição perfilada divide o g com esta: as estatísticas dela são separadas das nossas
+    outer_stats = {key: g.pop(key) for key in ('query_stats', 'request_started') if key in g}
+    with app.test_request_context('/' + target, query_string=query_string,
+                                  headers={'Cookie': request.headers.get('Cookie', '')}):
+        if use_pyinstrument:
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                return Response('pyinstrument não está instalado.\n', status=400, mimetype='text/plain')
+            profiler = Profiler()
+            profiler.start()
+            response = app.full_dispatch_request()
+            profiler.stop()
+            for key, value in outer_stats.items():
+                setattr(g, key, value)
+            return Response(profiler.output_html(), mimetype='text/html')
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        response = profiler.runcall(app.full_dispatch_request)
+        elapsed = (time.perf_counter() - started) * 1000
+    for key, value in outer_stats.items():
+        setattr(g, key, value)
+
+    report = io.StringIO()
+    report.write(f'GET /{target} -> {response.status_code} em {elapsed:.1f} ms\n\n')
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return Response(report.getvalue(), mimetype='text/plain')
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LoginThrottled(Exception):
+    """Tentativas de login acima do limite; retry_after em segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+class MemoryBuckets:
+    """Token buckets no processo (cada worker limita por conta própria), com descarte LRU."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Consome um token; devolve 0 ou os segundos até haver um token disponível."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Um bucket descartado volta cheio: só sai o que está parado há mais tempo
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class RedisBuckets:
+    """Token buckets compartilhados entre workers e instâncias (pacote opcional `redis`)."""
+
+    # Atualização atômica do bucket no servidor: lê, reabastece, consome e grava com TTL
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix='meubolso:ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[self.prefix + key], args=[capacity, rate, time.time()]))
+
+
+class LoginLimiter:
+    """Limite de tentativas de login por IP e por conta, com backend plugável.
+
+    Cada tentativa consome um token do IP e um da conta (e-mail); os buckets
+    reabastecem LOGIN_*_PER_MINUTE tokens por minuto até LOGIN_*_BURST. Como
+    a verificação só acontece depois, o custo de hash sob ataque fica limitado.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBuckets()
+        self.enabled = True
+        self.limits = {'ip': (20, 10 / 60), 'account': (5, 2 / 60)}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_RATE_LIMIT', True)
+        self.limits = {
+            'ip': (app.config.get('LOGIN_IP_BURST', 20), app.config.get('LOGIN_IP_PER_MINUTE', 10) / 60),
+            'account': (app.config.get('LOGIN_ACCOUNT_BURST', 5), app.config.get('LOGIN_ACCOUNT_PER_MINUTE', 2) / 60),
+        }
+        backend = app.config.get('RATELIMIT_BACKEND', 'memory')
+        if backend == 'redis':
+            self.backend = RedisBuckets(app.config['RATELIMIT_REDIS_URL'])
+        elif backend == 'memory':
+            self.backend = MemoryBuckets()
+        else:
+            raise ValueError(f'RATELIMIT_BACKEND desconhecido: {backend}')
+
+    def check(self, remote_addr, email):
+        """Consome as tentativas do IP e da conta; LoginThrottled se alguma estourou."""
+        from app.metrics import metrics
+
+        if not self.enabled:
+            return
+        for scope, key in (('ip', remote_addr or 'unknown'), ('account', (email or '').strip().lower())):
+            capacity, rate = self.limits[scope]
+            wait = self.backend.take(f'login:{scope}:{key}', capacity, rate)
+            if wait:
+                metrics.inc('login_throttled_total', scope=scope)
+                raise LoginThrottled(wait)
+
+
+login_limiter = LoginLimiter()
+
+
+def init_app(app):
+    login_limiter.init_app(app)
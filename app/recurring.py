@@ -0,0 +1,115 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from app import db
+from app.models import Transaction, RecurringRule
+from app.aggregates import apply_summary_deltas, summary_key
+from app.invoices import add_to_invoices
+
+DEFAULT_BATCH_SIZE = 200
+
+rule_table = RecurringRule.__table__
+transaction_table = Transaction.__table__
+
+
+def next_occurrence(frequency, current, anchor_day):
+    """Ocorrência seguinte a `current`; no mensal/anual o dia é limitado ao fim do mês (31 -> 28/29/30)."""
+    if frequency == 'weekly':
+        return current + timedelta(days=7)
+    if frequency == 'monthly':
+        year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+    elif frequency == 'yearly':
+        year, month = current.year + 1, current.month
+    else:
+        raise ValueError(f'Frequência inválida: {frequency}')
+    return date(year, month, min(anchor_day, monthrange(year, month)[1]))
+
+
+def due_dates(rule, until):
+    """Datas pendentes da regra até `until` (inclusive) e a próxima data depois delas."""
+    last = min(until, rule.end_date) if rule.end_date else until
+    dates = []
+    current = rule.next_date
+    while current <= last:
+        dates.append(current)
+        current = next_occurrence(rule.frequency, current, rule.start_date.day)
+    return dates, current
+
+
+def materialize_due(user_id=None, until=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Gera as transações das regras recorrentes vencidas até `until` (padrão: hoje).
+
+    Idempotente: cada regra é reservada com um UPDATE condicional em
+    next_date antes de gerar as ocorrências, então execuções simultâneas
+    (cron e login) nunca duplicam lançamentos. As ocorrências de um lote de
+    regras, inclusive a recuperação de meses atrasados, são gravadas num
+    único INSERT em massa, junto com o rollup e as faturas, e confirmadas
+    de uma vez. Retorna o número de transações criadas.
+    """
+    until = until or date.today()
+    conditions = [RecurringRule.active.is_(True), RecurringRule.next_date <= until]
+    if user_id is not None:
+        conditions.append(RecurringRule.user_id == user_id)
+
+    created = 0
+    last_id = 0
+    while True:
+        rules = RecurringRule.query.filter(*conditions, RecurringRule.id > last_id) \
+                                   .order_by(RecurringRule.id).limit(batch_size).all()
+        if not rules:
+            break
+        last_id = rules[-1].id
+
+        connection = db.session.connection()
+        rows = []
+        for rule in rules:
+            dates, next_date = due_dates(rule, until)
+            claimed = connection.execute(rule_table.update().where(
+                rule_table.c.id == rule.id,
+                rule_table.c.next_date == rule.next_date
+            ).values(
+                next_date=next_date,
+                active=rule.end_date is None or next_date <= rule.end_date
+            )).rowcount
+            if not claimed:
+                continue
+            rows.extend({
+                'type': rule.type,
+                'amount_cents': rule.amount_cents,
+                'description': rule.description,
+                'payment_method': None if rule.card_id else rule.payment_method,
+                'card_id': rule.card_id,
+                'category': rule.category,
+                'date': datetime.combine(when, time()),
+                'user_id': rule.user_id,
+            } for when in dates)
+
+        if rows:
+            connection.execute(transaction_table.insert(), rows)
+            deltas = defaultdict(lambda: [0, 0])
+            for row in rows:
+                key = summary_key(row['user_id'], row['date'], row['type'], row['category'],
+                                  row['payment_method'], row['card_id'])
+                deltas[key][0] += row['amount_cents']
+                deltas[key][1] += 1
+            apply_summary_deltas(connection, deltas)
+            add_to_invoices(connection, rows)
+        db.session.commit()
+        created += len(rows)
+    return created
+
+
+def add_rule(user_id, frequency, start_date=None, end_date=None, **fields):
+    """Cria uma regra recorrente e já gera as ocorrências vencidas (inclusive a de hoje)."""
+    if frequency not in RecurringRule.FREQUENCIES:
+        raise ValueError(f"Frequência inválida (use {', '.join(RecurringRule.FREQUENCIES)}).")
+    start_date = start_date or date.today()
+    if end_date and end_date < start_date:
+        raise ValueError('A data final deve ser posterior à data inicial.')
+    rule = RecurringRule(user_id=user_id, frequency=frequency, start_date=start_date,
+                         next_date=start_date, end_date=end_date, **fields)
+    db.session.add(rule)
+    db.session.commit()
+    materialize_due(user_id)
+    return rule
@@ -0,0 +1,69 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Sessão que manda as leituras das views marcadas com @read_replica para a réplica.
+
+    Flush, INSERT/UPDATE/DELETE e as leituras que vierem depois de uma
+    escrita na mesma requisição continuam no primário; sem réplica configurada
+    (ou fora de uma view marcada) o comportamento é o do Flask-SQLAlchemy.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_request_context() and g.get('read_replica') and not g.get('wrote_primary')):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _track_writes(conn, cursor, statement, parameters, context, executemany):
+    # Só escritas que alteraram linhas: UPDATEs/DELETEs que não casam nada não contam
+    if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    if cursor.rowcount != 0 and has_request_context():
+        g.wrote_primary = True
+
+
+def replica_enabled():
+    return REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def read_replica(view):
+    """Roteia as leituras da view para a réplica, salvo logo depois de uma escrita do usuário.
+
+    Quem gravou algo há menos de REPLICA_STICKY_SECONDS lê do primário
+    (read-your-writes), já que a réplica pode ainda não ter a alteração.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_enabled() and session.get('primary_until', 0) <= time.time():
+            g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _stick_to_primary(response):
+    if g.get('wrote_primary'):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def init_app(app):
+    """Liga a janela de leitura no primário após escritas quando há réplica (DATABASE_REPLICA_URL)."""
+    from sqlalchemy import event
+    from app import db
+
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    with app.app_context():
+        event.listen(db.engine, 'after_cursor_execute', _track_writes)
+    app.after_request(_stick_to_primary)
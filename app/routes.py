@@ -2,20 +2,33 @@ from flask import render_template, redirect, url_for, request, Blueprint, flash,
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
-from app.models import User, Transaction, Card
-from sqlalchemy import func, extract
-from datetime import datetime
-from calendar import monthrange
-from collections import defaultdict
+from app.models import User, Transaction, Card, RecurringRule, to_cents
+from app.aggregates import (month_range, month_transactions_query, month_totals, category_totals,
+                            transaction_years, user_categories, move_payment_method, payment_key,
+                            delete_transactions, trend_series)
+from app.importer import import_transactions
+from app.invoices import user_invoices, parse_closing_day
+from app.recurring import add_rule, materialize_due
+from app.search import search_transactions
+from app.budgets import budget_status, set_budget
+from app.passwords import authenticate
+from app.ratelimit import LoginThrottled
+from app.cache import get_user_cards, payment_fields, versioned_page
+from app.replica import read_replica
+from datetime import date, datetime, timedelta
+import logging
 
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 20
 
 @main_bp.app_template_filter('format_date')
 def format_date_filter(value):
     """Filtro para formatar um objeto de data ou string de data."""
     if value is None:
         return ""
-    if isinstance(value, datetime):
+    if isinstance(value, date):
         return value.strftime('%d/%m/%Y')
     return datetime.fromisoformat(value).strftime('%d/%m/%Y')
 
@@ -33,9 +46,14 @@ def login():
             flash('Por favor, preencha todos os campos.', 'danger')
             return redirect(url_for('main.login'))
 
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        try:
+            user = authenticate(email, password, request.remote_addr)
+        except LoginThrottled as e:
+            flash(f'Muitas tentativas de login. Tente novamente em {e.retry_after} segundos.', 'danger')
+            return render_template('login.html'), 429
+        if user:
             login_user(user)
+            materialize_due(user.id)  # lançamentos recorrentes pendentes desde o último acesso
             flash('Login realizado com sucesso!', 'success')
             return redirect(url_for('main.dashboard'))
         else:
@@ -72,6 +90,8 @@ def register():
 # Dashboard (só acessível logado)
 @main_bp.route('/dashboard', methods=['GET'])
 @login_required
+@read_replica
+@versioned_page
 def dashboard():
     user_id = current_user.id
     now = datetime.now()
@@ -79,56 +99,35 @@ def dashboard():
     try:
         selected_month = int(request.args.get('month', now.month))
         selected_year = int(request.args.get('year', now.year))
+        month_range(selected_year, selected_month)
     except (ValueError, TypeError):
         selected_month = now.month
         selected_year = now.year
     
     # 1. Obter Transações do Mês Selecionado (Exibidas na lista)
-    transactions = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        extract('month', Transaction.date) == selected_month,
-        extract('year', Transaction.date) == selected_year
-    ).order_by(Transaction.date.desc()).all()
+    transactions = month_transactions_query(user_id, selected_year, selected_month).all()
+
+    cards = get_user_cards(user_id)
 
-    total_income = sum(t.amount for t in transactions if t.type == 'income')
-    total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-    balance = total_income - total_expense
+    # 2. Totais do mês (receitas e despesas) em uma única consulta agrupada
+    totals = month_totals(user_id, selected_year, selected_month)
+    total_income = totals['income']
+    total_expense = totals['expense']
+    balance = totals['balance']
 
-    years = sorted(list(set(t.date.year for t in Transaction.query.filter_by(user_id=user_id).all())))
+    years = transaction_years(user_id)
     if not years:
         years = range(now.year - 1, now.year + 2) # Garante que haja anos para o filtro
 
     month_names = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
     
-    # --- Lógica de Fatura de Cartão (Simplificada) ---
-    
-    cards = Card.query.filter_by(user_id=user_id).all()
-    invoices = {'open': [], 'closed': []}
-    
-    # Busca todas as transações de cartão de crédito do usuário
-    all_card_transactions_db = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        Transaction.payment_method.in_([c.name for c in cards]),
-        Transaction.type == 'expense'
-    ).all()
-    
-    # Calcula o total gasto por cartão no mês selecionado (Fatura Fechada Simplificada)
-    for card in cards:
-        total_card_expense = sum(
-            t.amount for t in all_card_transactions_db 
-            if t.payment_method == card.name and 
-               extract('month', t.date) == selected_month and 
-               extract('year', t.date) == selected_year
-        )
-        invoices['closed'].append({
-            'card_id': card.id, 
-            'name': card.name, 
-            'amount': total_card_expense, 
-            'due_day': card.due_day
-        })
+    # --- Faturas de Cartão ---
+    # Fatura aberta atual e fatura fechada no mês selecionado, lidas da tabela Invoice
+    invoices = user_invoices(user_id, selected_year, selected_month)
+    budgets = budget_status(user_id, selected_year, selected_month)
 
     # O total geral do cartão no resumo
-    credit_card_bill = sum(t.amount for t in transactions if t.payment_method == 'Cartao de Credito' and t.type == 'expense')
+    credit_card_bill = totals['credit_card']
     
     
     return render_template(
@@ -140,6 +139,7 @@ def dashboard():
         transactions=transactions,
         credit_card_bill=credit_card_bill,
         invoices=invoices,
+        budgets=budgets,
         selected_month=selected_month,
         selected_year=selected_year,
         month_names=month_names,
@@ -152,7 +152,7 @@ def dashboard():
 @login_required
 def add():
     categories = ['Alimentação', 'Transporte', 'Moradia', 'Saúde', 'Lazer', 'Educação', 'Salário', 'Outros']
-    cards = Card.query.filter_by(user_id=current_user.id).all()
+    cards = get_user_cards(current_user.id)
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -163,24 +163,35 @@ def add():
             description = request.form.get('description', '')
             payment_method = request.form.get('payment_method')
             category = request.form.get('category')
+            frequency = request.form.get('frequency')
             
             if not all([type_, amount, payment_method, category]):
                 flash('Por favor, preencha todos os campos obrigatórios da transação.', 'danger')
                 return redirect(url_for('main.add'))
                 
             try:
-                amount = float(amount)
-            except (ValueError, TypeError):
+                amount_cents = to_cents(amount)
+            except ValueError:
                 flash('O valor da transação deve ser um número válido.', 'danger')
                 return redirect(url_for('main.add'))
 
+            if frequency:
+                try:
+                    add_rule(current_user.id, frequency, type=type_, amount_cents=amount_cents, description=description,
+                             category=category, **payment_fields(current_user.id, payment_method))
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(url_for('main.add'))
+                flash('Transação recorrente adicionada com sucesso!', 'success')
+                return redirect(url_for('main.dashboard'))
+
             new_transaction = Transaction(
                 type=type_,
-                amount=amount,
+                amount_cents=amount_cents,
                 description=description,
-                payment_method=payment_method,
                 category=category,
-                user_id=current_user.id
+                user_id=current_user.id,
+                **payment_fields(current_user.id, payment_method)
             )
             db.session.add(new_transaction)
             db.session.commit()
@@ -194,42 +205,50 @@ def add():
                 return redirect(url_for('main.add'))
             
             try:
-                amount = float(income_value)
-            except (ValueError, TypeError):
+                amount_cents = to_cents(income_value)
+            except ValueError:
                 flash('O valor da renda deve ser um número válido.', 'danger')
                 return redirect(url_for('main.add'))
 
-            new_income_transaction = Transaction(
-                type='income',
-                amount=amount,
-                description='Renda Fixa',
-                payment_method='Transferencia',
-                category='Salario',
-                user_id=current_user.id
-            )
-            db.session.add(new_income_transaction)
-            db.session.commit()
+            if request.form.get('recurring'):
+                # Renda fixa mensal: a ocorrência de hoje é gerada agora e as próximas pelo agendador
+                add_rule(current_user.id, 'monthly', type='income', amount_cents=amount_cents, description='Renda Fixa',
+                         payment_method='Transferencia', category='Salario')
+            else:
+                new_income_transaction = Transaction(
+                    type='income',
+                    amount_cents=amount_cents,
+                    description='Renda Fixa',
+                    payment_method='Transferencia',
+                    category='Salario',
+                    user_id=current_user.id
+                )
+                db.session.add(new_income_transaction)
+                db.session.commit()
             flash('Renda fixa adicionada com sucesso!', 'success')
             return redirect(url_for('main.dashboard'))
 
         elif action == 'add_card':
             card_name = request.form.get('card_name')
             card_due_day = request.form.get('card_due_day')
+            card_closing_day = request.form.get('card_closing_day')
             if not card_name or not card_due_day:
                 flash('Por favor, preencha todos os campos do cartão.', 'danger')
                 return redirect(url_for('main.add'))
             
             try:
                 due_day = int(card_due_day)
+                closing_day = parse_closing_day(card_closing_day)
                 if not 1 <= due_day <= 31:
-                    raise ValueError("Dia de fechamento inválido.")
+                    raise ValueError("Dia de vencimento inválido.")
             except (ValueError, TypeError):
-                flash('O dia de fechamento do cartão deve ser um número entre 1 e 31.', 'danger')
+                flash('Os dias de vencimento e fechamento do cartão devem ser números entre 1 e 31.', 'danger')
                 return redirect(url_for('main.add'))
             
             new_card = Card(
                 name=card_name,
                 due_day=due_day,
+                closing_day=closing_day,
                 user_id=current_user.id
             )
             db.session.add(new_card)
@@ -237,53 +256,105 @@ def add():
             flash('Cartão adicionado com sucesso!', 'success')
             return redirect(url_for('main.dashboard'))
     
+        elif action == 'add_budget':
+            category = request.form.get('budget_category')
+            try:
+                limit_cents = to_cents(request.form.get('budget_limit'))
+                # Campo <input type="month"> ("AAAA-MM"); vazio = mês atual
+                period = request.form.get('budget_period') or datetime.now().strftime('%Y-%m')
+                year, month = (int(part) for part in period.split('-'))
+                month_range(year, month)
+                if limit_cents <= 0:
+                    raise ValueError("Limite inválido.")
+            except (ValueError, TypeError):
+                flash('O limite do orçamento deve ser um número positivo e o mês válido.', 'danger')
+                return redirect(url_for('main.add'))
+            if not category:
+                flash('Selecione a categoria do orçamento.', 'danger')
+                return redirect(url_for('main.add'))
+
+            set_budget(current_user.id, category, year, month, limit_cents)
+            flash('Orçamento salvo com sucesso!', 'success')
+            return redirect(url_for('main.dashboard'))
+
+        elif action == 'import_transactions':
+            upload = request.files.get('import_file')
+            if not upload or not upload.filename:
+                flash('Selecione um arquivo para importar.', 'danger')
+                return redirect(url_for('main.add'))
+
+            fmt = upload.filename.rsplit('.', 1)[-1].lower()
+            dry_run = request.form.get('dry_run') == 'on'
+            try:
+                result = import_transactions(
+                    current_user.id, upload.stream, fmt,
+                    dry_run=dry_run,
+                    skip_invalid=request.form.get('skip_invalid') == 'on',
+                    default_payment_method=request.form.get('payment_method') or None
+                )
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.add'))
+
+            for error in result['errors'][:10]:
+                flash(f"Linha {error['row']}: {error['error']}", 'warning')
+            if result['committed']:
+                flash(f"{result['imported']} transações importadas ({result['rows_per_second']} linhas/s).", 'success')
+                return redirect(url_for('main.dashboard'))
+            if dry_run:
+                flash(f"Simulação: {result['valid_rows']} linhas válidas e {result['error_count']} com erro.", 'info')
+            else:
+                flash(f"Nenhuma transação importada: {result['error_count']} linhas com erro.", 'danger')
+            return redirect(url_for('main.add'))
+    
     return render_template('add_transaction.html', active_page='add', categories=categories, cards=cards)
 
+# Busca de transações (índice de texto completo)
+@main_bp.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    offset = request.args.get('offset', 0, type=int)
+    transactions, next_offset = search_transactions(current_user.id, query, SEARCH_PAGE_SIZE, offset)
+    return render_template(
+        'search.html',
+        active_page='search',
+        query=query,
+        transactions=transactions,
+        offset=offset,
+        next_offset=next_offset,
+        page_size=SEARCH_PAGE_SIZE
+    )
+
 # Relatórios
 @main_bp.route('/reports')
 @login_required
+@read_replica
+@versioned_page
 def reports():
     user_id = current_user.id
 
     try:
         current_year = int(request.args.get('year', datetime.now().year))
         current_month = int(request.args.get('month', datetime.now().month))
+        month_range(current_year, current_month)
     except (ValueError, TypeError):
         current_year = datetime.now().year
         current_month = datetime.now().month
         flash('Filtro de data inválido. Exibindo dados do mês atual.', 'warning')
 
-    start_date = datetime(current_year, current_month, 1)
-    end_date = datetime(current_year, current_month, monthrange(current_year, current_month)[1], 23, 59, 59)
-
-    transactions = Transaction.query.filter_by(user_id=user_id) \
-                                   .filter(Transaction.date.between(start_date, end_date)) \
-                                   .order_by(Transaction.date.desc()) \
-                                   .all()
+    transactions = month_transactions_query(user_id, current_year, current_month).all()
     
-    expenses_by_category = defaultdict(float)
-    for transaction in transactions:
-        if transaction.type == 'expense':
-            expenses_by_category[transaction.category] += transaction.amount
+    expenses_by_category = category_totals(user_id, current_year, current_month, 'expense')
     
     expense_labels = list(expenses_by_category.keys())
     expense_data = list(expenses_by_category.values())
 
-    trend_income = defaultdict(float)
-    trend_expense = defaultdict(float)
-    
-    # Gerar todas as datas do mês para o gráfico
-    num_days = monthrange(current_year, current_month)[1]
-    trend_labels = [f"{day}/{current_month}" for day in range(1, num_days + 1)]
-    trend_income_data = [0] * num_days
-    trend_expense_data = [0] * num_days
-
-    for transaction in transactions:
-        day = transaction.date.day
-        if transaction.type == 'income':
-            trend_income_data[day - 1] += transaction.amount
-        else:
-            trend_expense_data[day - 1] += transaction.amount
+    # Série diária do mês para o gráfico (consulta agrupada por dia)
+    trend = trend_series(user_id, current_year, current_month, granularity='day')
+    trend_labels = trend['labels']
+    trend_income_data = trend['income']
+    trend_expense_data = trend['expense']
     
     transactions_data = [{
         'id': t.id,
@@ -295,15 +366,17 @@ def reports():
         'date': t.date.isoformat() 
     } for t in transactions]
 
-    cards = Card.query.filter_by(user_id=user_id).all()
+    cards = get_user_cards(user_id)
 
-    total_income = sum(t.amount for t in transactions if t.type == 'income')
-    total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-    balance = total_income - total_expense
+    totals = month_totals(user_id, current_year, current_month)
+    budgets = budget_status(user_id, current_year, current_month)
+    total_income = totals['income']
+    total_expense = totals['expense']
+    balance = totals['balance']
 
     month_names = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
     
-    all_categories = sorted(list(set(t.category for t in Transaction.query.filter_by(user_id=user_id).all() if t.category)))
+    all_categories = user_categories(user_id)
     if not all_categories:
         all_categories = ['Alimentação', 'Transporte', 'Lazer', 'Moradia', 'Educação', 'Saúde', 'Salário', 'Outros']
 
@@ -324,63 +397,80 @@ def reports():
         trend_labels=trend_labels,
         trend_income_data=trend_income_data,
         trend_expense_data=trend_expense_data,
-        all_categories=all_categories
+        all_categories=all_categories,
+        budgets=budgets
     )
 
 # Deletar uma transação
 @main_bp.route('/delete_transaction/<int:transaction_id>', methods=['DELETE'])
 @login_required
 def delete_transaction(transaction_id):
-    print(f"Recebida requisição DELETE para a transação com ID: {transaction_id}")
     transaction = Transaction.query.get_or_404(transaction_id)
     if transaction.user_id != current_user.id:
-        print("Erro: Usuário não autorizado para deletar esta transação.")
+        logger.warning('Usuário %s sem permissão para deletar a transação %s', current_user.id, transaction_id)
         return jsonify({'status': 'error', 'message': 'Você não tem permissão para deletar esta transação.'}), 403
     try:
         db.session.delete(transaction)
         db.session.commit()
-        print("Sucesso: Transação deletada com sucesso!")
         return jsonify({'status': 'success', 'message': 'Transação deletada com sucesso!'}), 200
     except Exception as e:
         db.session.rollback()
-        print(f"Erro ao deletar a transação: {str(e)}")
+        logger.exception('Erro ao deletar a transação %s', transaction_id)
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # Editar uma transação
 @main_bp.route('/edit_transaction/<int:transaction_id>', methods=['POST'])
 @login_required
 def edit_transaction(transaction_id):
-    print(f"Recebida requisição POST para a transação com ID: {transaction_id}")
     transaction = Transaction.query.get_or_404(transaction_id)
     if transaction.user_id != current_user.id:
-        print("Erro: Usuário não autorizado para editar esta transação.")
+        logger.warning('Usuário %s sem permissão para editar a transação %s', current_user.id, transaction_id)
         return jsonify({'status': 'error', 'message': 'Você não tem permissão para editar esta transação.'}), 403
 
     data = request.json
     try:
         transaction.amount = float(data['amount'])
         transaction.description = data['description']
-        transaction.payment_method = data['payment_method']
+        for field, value in payment_fields(current_user.id, data['payment_method']).items():
+            setattr(transaction, field, value)
         transaction.category = data['category']
         transaction.type = data['type']
         
         db.session.commit()
-        print("Sucesso: Transação atualizada com sucesso!")
         return jsonify({'status': 'success', 'message': 'Transação atualizada com sucesso!'}), 200
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Erro ao editar a transação: {str(e)}")
+        logger.info('Dados inválidos ao editar a transação %s', transaction_id, exc_info=True)
         return jsonify({'status': 'error', 'message': 'Dados inválidos, por favor, verifique os campos.'}), 400
     
-# Limpar todos os dados do usuário
+# Limpar os dados do usuário (todos ou de um período/categoria)
 @main_bp.route('/clear_data', methods=['POST'])
 @login_required
 def clear_data():
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    for transaction in transactions:
-        db.session.delete(transaction)
-    db.session.commit()
-    flash('Todos os dados foram apagados com sucesso!', 'success')
+    scope = request.get_json(silent=True) or request.form
+    start = end = None
+    try:
+        if scope.get('year') and scope.get('month'):
+            start, end = month_range(int(scope['year']), int(scope['month']))
+        else:
+            if scope.get('start'):
+                start = datetime.strptime(scope['start'], '%Y-%m-%d')
+            if scope.get('end'):
+                end = datetime.strptime(scope['end'], '%Y-%m-%d') + timedelta(days=1)
+    except (ValueError, TypeError):
+        if request.is_json:
+            return jsonify({'status': 'error', 'message': 'Período inválido.'}), 400
+        flash('Período inválido.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    removed = delete_transactions(current_user.id, start, end, scope.get('category') or None)
+
+    if request.is_json:
+        return jsonify({'status': 'success', 'deleted': removed}), 200
+    if start or end or scope.get('category'):
+        flash(f'{removed} transações apagadas com sucesso!', 'success')
+    else:
+        flash(f'Todos os dados foram apagados com sucesso! ({removed} transações)', 'success')
     return redirect(url_for('main.dashboard'))
 
 # --- NOVAS ROTAS DE CARTÃO ---
@@ -404,21 +494,18 @@ def edit_card(card_id):
         due_day_int = int(new_due_day)
         if not 1 <= due_day_int <= 31:
             return jsonify({'status': 'error', 'message': 'O dia de vencimento deve ser entre 1 e 31.'}), 400
+        closing_day = parse_closing_day(data.get('closing_day'))
 
-        # Renomear as transações existentes para o novo nome do cartão (IMPORTANTE!)
-        if new_name != card.name:
-            Transaction.query.filter_by(user_id=current_user.id, payment_method=card.name).update(
-                {'payment_method': new_name}
-            )
-            
+        # As transações apontam para o cartão pelo card_id: renomear altera só esta linha
         card.name = new_name
         card.due_day = due_day_int
+        card.closing_day = closing_day
         
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Cartão atualizado com sucesso!'}), 200
     except (ValueError, TypeError):
         db.session.rollback()
-        return jsonify({'status': 'error', 'message': 'Dia de vencimento inválido.'}), 400
+        return jsonify({'status': 'error', 'message': 'Dia de vencimento ou de fechamento inválido.'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -433,8 +520,12 @@ def delete_card(card_id):
 
     try:
         # Transforma as transações do cartão em "Dinheiro" para não perdê-las
-        Transaction.query.filter_by(user_id=current_user.id, payment_method=card.name).update(
-            {'payment_method': 'Dinheiro'}
+        Transaction.query.filter_by(card_id=card.id).update(
+            {'card_id': None, '_payment_method': 'Dinheiro'}
+        )
+        move_payment_method(current_user.id, payment_key(None, card.id), 'Dinheiro')
+        RecurringRule.query.filter_by(card_id=card.id).update(
+            {'card_id': None, 'payment_method': 'Dinheiro'}
         )
         
         db.session.delete(card)
@@ -455,7 +546,8 @@ def get_card_details(card_id):
     return jsonify({
         'id': card.id,
         'name': card.name,
-        'due_day': card.due_day
+        'due_day': card.due_day,
+        'closing_day': card.closing_day
     }), 200
 
 # Fim das Novas Rotas
@@ -0,0 +1,175 @@
+import re
+import unicodedata
+
+from app import db
+from app.models import Transaction
+from sqlalchemy import and_, bindparam, or_, text
+from sqlalchemy.orm import joinedload
+
+MAX_TERMS = 8
+MAX_OFFSET = 10000
+
+# SQLite: tabela FTS5 sincronizada por triggers. A coluna `owner` ('u<id>') entra na
+# consulta MATCH para que o índice já restrinja ao usuário. O nome do cartão não é
+# copiado para o índice (renomear um cartão altera só a linha do cartão): compras em
+# cartão são encontradas pelo nome na consulta, com card_id IN (...).
+SQLITE_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5(
+        owner, description, category, payment_method,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    'DROP TRIGGER IF EXISTS card_fts_au',
+    'DROP TRIGGER IF EXISTS transaction_fts_ai',
+    """CREATE TRIGGER transaction_fts_ai AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_ad AFTER DELETE ON "transaction" BEGIN
+        DELETE FROM transaction_fts WHERE rowid = old.id;
+    END""",
+    'DROP TRIGGER IF EXISTS transaction_fts_au',
+    """CREATE TRIGGER transaction_fts_au
+    AFTER UPDATE OF user_id, description, category, payment_method ON "transaction" BEGIN
+        DELETE FROM transaction_fts WHERE rowid = old.id;
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+)
+
+SQLITE_REBUILD = (
+    "DELETE FROM transaction_fts",
+    """INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+    SELECT t.id, 'u' || t.user_id, t.description, t.category, t.payment_method FROM "transaction" t""",
+)
+
+# PostgreSQL: coluna tsvector mantida por trigger e índice GIN
+POSTGRES_DDL = (
+    'ALTER TABLE "transaction" ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'DROP TRIGGER IF EXISTS card_search_vector ON card',
+    'DROP FUNCTION IF EXISTS card_search_vector_update()',
+    """CREATE OR REPLACE FUNCTION transaction_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple',
+            coalesce(NEW.description, '') || ' ' || coalesce(NEW.category, '') || ' ' ||
+            coalesce(NEW.payment_method, ''));
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS transaction_search_vector ON "transaction"',
+    """CREATE TRIGGER transaction_search_vector
+    BEFORE INSERT OR UPDATE OF description, category, payment_method ON "transaction"
+    FOR EACH ROW EXECUTE FUNCTION transaction_search_vector_update()""",
+    'CREATE INDEX IF NOT EXISTS ix_transaction_search_vector ON "transaction" USING GIN (search_vector)',
+)
+
+POSTGRES_REBUILD = (
+    'UPDATE "transaction" SET description = description',
+)
+
+
+def install_search_index(connection=None, rebuild=False):
+    """Cria (se faltar) o índice de busca e, com rebuild, o repopula a partir das transações.
+
+    Necessário em bancos criados com db.create_all(); as migrações já fazem isso.
+    """
+    connection = connection or db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        ddl, refill = POSTGRES_DDL, POSTGRES_REBUILD
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'transaction' AND column_name = 'search_vector'").first()
+    else:
+        ddl, refill = SQLITE_DDL, SQLITE_REBUILD
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'transaction_fts'").first()
+    # Índice recém-criado começa vazio: preenche com as transações existentes
+    for statement in ddl + (refill if rebuild or not exists else ()):
+        connection.exec_driver_sql(statement)
+
+
+def search_terms(query):
+    """Palavras da busca (no máximo MAX_TERMS), sem operadores da sintaxe FTS."""
+    return re.findall(r'\w+', query or '')[:MAX_TERMS]
+
+
+def _fold(word):
+    # Mesma normalização do tokenizer do índice: sem acentos e sem caixa
+    return ''.join(c for c in unicodedata.normalize('NFKD', word) if not unicodedata.combining(c)).casefold()
+
+
+def card_matches(user_id, terms):
+    """Cartões do usuário cujo nome contém alguma das palavras (como prefixo), agrupados
+    pelas palavras que sobram para a descrição/categoria: {(palavras restantes): [ids]}."""
+    from app.cache import get_user_cards
+
+    matches = {}
+    for card in get_user_cards(user_id):
+        words = [_fold(word) for word in re.findall(r'\w+', card.name or '')]
+        rest = tuple(term for term in terms if not any(word.startswith(_fold(term)) for word in words))
+        if len(rest) < len(terms):
+            matches.setdefault(rest, []).append(card.id)
+    return matches
+
+
+def _fts_match(user_id, terms):
+    return 'owner:u{} AND {{description category payment_method}}: ({})'.format(
+        int(user_id), ' AND '.join('"{}"*'.format(term) for term in terms))
+
+
+def _tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_transactions(user_id, query, limit=20, offset=0, base_query=None):
+    """Transações do usuário que contêm todas as palavras (prefixo) em descrição,
+    categoria ou forma de pagamento, das mais relevantes para as menos.
+
+    O nome do cartão não está no índice: as palavras encontradas no nome de
+    um cartão (lista pequena, do cache) valem para as compras nele, e só as
+    restantes precisam estar no índice.
+
+    `base_query` permite aplicar filtros adicionais (período, tipo) à consulta.
+    Retorna (transações, próximo offset ou None).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], None
+    offset = min(max(offset, 0), MAX_OFFSET)
+    base_query = base_query if base_query is not None else Transaction.query
+    base_query = base_query.options(joinedload(Transaction.card)).filter(Transaction.user_id == user_id)
+
+    cards = card_matches(user_id, terms)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        vector = '"transaction".search_vector'
+        rank = text(f"ts_rank({vector}, to_tsquery('simple', :q)) DESC")
+        conditions = [text(f"{vector} @@ to_tsquery('simple', :q)")]
+        for i, (rest, card_ids) in enumerate(cards.items()):
+            condition = Transaction.card_id.in_(card_ids)
+            if rest:
+                condition = and_(condition, text(f"{vector} @@ to_tsquery('simple', :q{i})")
+                                 .bindparams(bindparam(f'q{i}', _tsquery(rest))))
+            conditions.append(condition)
+        rows = base_query.filter(or_(*conditions)) \
+                         .order_by(rank, Transaction.id.desc()) \
+                         .params(q=_tsquery(terms)).limit(limit + 1).offset(offset).all()
+    else:
+        selects = ['SELECT rowid AS id, rank FROM transaction_fts WHERE transaction_fts MATCH :match']
+        params = [bindparam('match', _fts_match(user_id, terms))]
+        for i, (rest, card_ids) in enumerate(cards.items()):
+            # rank do FTS5 é negativo (menor = mais relevante): só pelo cartão (0) vem depois
+            if rest:
+                selects.append(f'SELECT transaction_fts.rowid, transaction_fts.rank FROM transaction_fts '
+                               f'JOIN "transaction" t ON t.id = transaction_fts.rowid '
+                               f'WHERE transaction_fts MATCH :match{i} AND t.card_id IN :cards{i}')
+                params.append(bindparam(f'match{i}', _fts_match(user_id, rest)))
+            else:
+                selects.append(f'SELECT id, 0 FROM "transaction" WHERE card_id IN :cards{i}')
+            params.append(bindparam(f'cards{i}', card_ids, expanding=True))
+        sql = selects[0] if len(selects) == 1 else \
+            'SELECT id, min(rank) AS rank FROM ({}) GROUP BY id'.format(' UNION ALL '.join(selects))
+        hits = text(sql).bindparams(*params).columns(id=db.Integer, rank=db.Float).subquery('hits')
+        rows = base_query.join(hits, hits.c.id == Transaction.id) \
+                         .order_by(hits.c.rank, Transaction.id.desc()) \
+                         .limit(limit + 1).offset(offset).all()
+
+    next_offset = offset + limit if len(rows) > limit else None
+    return rows[:limit], next_offset
@@ -0,0 +1,7 @@
+"""Ponto de entrada ASGI: leituras da API com I/O assíncrono e o restante pelo Flask.
+
+Uso: flask --app wsgi db upgrade && uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+"""
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,75 @@
+"""Compara totais em float (modelo antigo) com centavos inteiros (modelo atual).
+
+Uso: python benchmarks/bench_amounts.py [--rows 200000] [--days 31]
+
+Mede o tempo de cada abordagem e o erro em relação à soma exata com Decimal:
+  - float: carrega as linhas e soma `amount` em Python, como o dashboard fazia;
+  - cents: SUM(amount_cents) no SQLite;
+  - buckets por dia: laço em Python vs. np.bincount sobre centavos.
+"""
+import argparse
+import random
+import sqlite3
+import time
+from decimal import Decimal
+
+import numpy as np
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cents = [rng.randint(1, 500000) for _ in range(args.rows)]
+    days = [rng.randint(1, args.days) for _ in range(args.rows)]
+    exact = sum(Decimal(c) / 100 for c in cents)
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE old (amount REAL NOT NULL, day INTEGER NOT NULL)')
+    conn.execute('CREATE TABLE new (amount_cents INTEGER NOT NULL, day INTEGER NOT NULL)')
+    conn.executemany('INSERT INTO old VALUES (?, ?)', ((c / 100, d) for c, d in zip(cents, days)))
+    conn.executemany('INSERT INTO new VALUES (?, ?)', zip(cents, days))
+
+    float_total, float_time = timed(
+        lambda: sum(row[0] for row in conn.execute('SELECT amount FROM old')))
+    cents_total, cents_time = timed(
+        lambda: conn.execute('SELECT SUM(amount_cents) FROM new').fetchone()[0])
+
+    def python_buckets():
+        buckets = [0.0] * args.days
+        for amount, day in conn.execute('SELECT amount, day FROM old'):
+            buckets[day - 1] += amount
+        return buckets
+
+    def numpy_buckets():
+        rows = conn.execute('SELECT day, SUM(amount_cents) FROM new GROUP BY day').fetchall()
+        positions = np.fromiter((r[0] - 1 for r in rows), dtype=np.int64, count=len(rows))
+        weights = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        return np.bincount(positions, weights=weights, minlength=args.days) / 100
+
+    _, python_buckets_time = timed(python_buckets)
+    _, numpy_buckets_time = timed(numpy_buckets)
+
+    print(f'linhas: {args.rows}  soma exata: {exact}')
+    print(f'{"abordagem":<28}{"tempo (ms)":>12}{"erro":>24}')
+    print(f'{"float + sum() em Python":<28}{float_time * 1000:>12.2f}{abs(Decimal(repr(float_total)) - exact):>24}')
+    print(f'{"SUM(amount_cents) no SQL":<28}{cents_time * 1000:>12.2f}{abs(Decimal(cents_total) / 100 - exact):>24}')
+    print(f'{"buckets: laço em Python":<28}{python_buckets_time * 1000:>12.2f}')
+    print(f'{"buckets: GROUP BY + bincount":<28}{numpy_buckets_time * 1000:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Teste de carga da API: workers síncronos do gunicorn vs. entrada ASGI (uvicorn).
+
+Uso: python benchmarks/bench_async.py [--workers 2] [--connections 200] [--seconds 15]
+                                      [--transactions 20000] [--database sqlite:///...]
+
+Popula um banco (SQLite temporário por padrão, como substituto local do
+banco de produção) com benchmarks/seed.py e sobe, um de cada vez, com
+--workers processos:
+  "sync":  gunicorn wsgi:app (workers sync, uma requisição por worker);
+  "async": uvicorn asgi:app (event loop com aiosqlite/asyncpg).
+Um cliente asyncio abre --connections conexões simultâneas (keep-alive
+quando o servidor permite), autenticadas com o mesmo cookie de sessão, e
+alterna GET /api/transactions, /api/cards e /api/reports/summary durante
+--seconds. Mostra req/s, p50 e p99 da latência e as falhas de cada modo.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ('/api/transactions?limit=50', '/api/cards', '/api/reports/summary')
+
+
+def server_command(mode, port, workers):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                '--log-level', 'warning', 'wsgi:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--no-access-log']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare(args):
+    from app import create_app, db
+    from app.search import install_search_index
+    from seed import seed
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        install_search_index()
+        db.session.commit()
+        return seed(1, args.transactions, 3)[0]
+
+
+def login(port, email, password):
+    """Cookie de sessão obtido pelo POST /login (sem seguir o redirect)."""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    data = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+    try:
+        urllib.request.build_opener(NoRedirect).open(f'http://127.0.0.1:{port}/login', data)
+    except urllib.error.HTTPError as e:
+        cookie = e.headers.get('Set-Cookie', '')
+        if e.code == 302 and cookie.startswith('session='):
+            return cookie.split(';', 1)[0]
+    raise SystemExit('Falha no login do usuário de benchmark.')
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Servidor encerrou com código {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.05)
+    raise SystemExit('Servidor não respondeu a tempo.')
+
+
+async def read_response(reader):
+    """(status, fechar conexão) de uma resposta HTTP/1.1 com Content-Length."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('conexão fechada')
+    status = int(status_line.split()[1])
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def client(port, cookie, deadline, index, latencies, failures):
+    reader = writer = None
+    i = index
+    while time.perf_counter() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n\r\n'.encode())
+            await writer.drain()
+            status, close = await read_response(reader)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            failures.append(path)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures.append(path)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, cookie, connections, seconds):
+    latencies, failures = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, cookie, deadline, i, latencies, failures) for i in range(connections)))
+    return latencies, failures
+
+
+def run_mode(mode, args, email, password):
+    from seed import BENCH_PASSWORD
+
+    port = free_port()
+    process = subprocess.Popen(server_command(mode, port, args.workers), cwd=ROOT, env=dict(os.environ))
+    try:
+        wait_ready(port, process)
+        cookie = login(port, email, password or BENCH_PASSWORD)
+        asyncio.run(load(port, cookie, args.connections, 2))  # aquecimento
+        latencies, failures = asyncio.run(load(port, cookie, args.connections, args.seconds))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    else:
+        p50 = p99 = float('nan')
+    print(f'{mode:<8}{len(latencies) / args.seconds:>10.1f}{p50:>12.1f}{p99:>12.1f}{len(failures):>9}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--connections', type=int, default=200, help='Conexões simultâneas do cliente.')
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--database', default=None, help='URL do banco (padrão: SQLite temporário).')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database or 'sqlite:///' + os.path.join(tmp, 'bench.db')
+    os.environ['METRICS_DIR'] = os.path.join(tmp, 'metrics')
+    os.environ['FAST_START'] = '1'
+    user_id = prepare(args)
+
+    print(f'{args.workers} worker(s), {args.connections} conexões, {args.seconds:g}s por modo')
+    print(f'{"modo":<8}{"req/s":>10}{"p50 (ms)":>12}{"p99 (ms)":>12}{"falhas":>9}')
+    for mode in ('sync', 'async'):
+        run_mode(mode, args, f'bench{user_id}@example.com', None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Vazão de escrita com vários workers no SQLite: padrões do SQLite vs. PRAGMAs de produção.
+
+Uso: python benchmarks/bench_concurrency.py [--workers 4] [--seconds 10] [--write-ratio 0.5]
+
+Para cada modo ("antes": SQLITE_TUNING=0, journal em rollback; "depois":
+WAL, synchronous=NORMAL, busy_timeout etc.) cria um banco SQLite próprio e
+sobe --workers processos, como os workers do gunicorn. Cada um faz login
+com seu usuário e, durante --seconds, alterna POST /api/transactions
+(escritas) e GET /api/transactions (leituras) pelo test client. Mostra
+escritas e leituras por segundo, p95 das escritas e as falhas ("database
+is locked" e afins, que viram HTTP 500).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {'antes': '0', 'depois': '1'}
+
+
+def prepare(database_url, tuning, workers):
+    """Cria o banco do modo (o journal_mode WAL fica gravado no arquivo) e um usuário por worker."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['SQLITE_TUNING'] = tuning
+    from app import create_app, db
+    from app.search import install_search_index
+    from seed import seed
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        install_search_index()
+        db.session.commit()
+        return seed(workers, 500, 1)
+
+
+def worker(database_url, tuning, user_id, seconds, write_ratio, start_at, results):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['SQLITE_TUNING'] = tuning
+    os.environ['METRICS_ENABLED'] = '0'
+    from app import create_app
+    from seed import BENCH_PASSWORD
+
+    app = create_app()
+    logging.getLogger('app').setLevel(logging.CRITICAL)  # os 500 esperados não poluem a saída
+    client = app.test_client()
+    client.post('/login', data={'email': f'bench{user_id}@example.com', 'password': BENCH_PASSWORD})
+    rng = random.Random(user_id)
+
+    writes, reads, errors, write_times = 0, 0, 0, []
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            try:
+                response = client.post('/api/transactions', json={
+                    'type': 'expense', 'amount': f'{rng.uniform(1, 100):.2f}', 'description': 'Concorrência',
+                    'payment_method': 'Dinheiro', 'category': 'Outros'})
+                ok = response.status_code == 201
+            except Exception:
+                ok = False
+            if ok:
+                writes += 1
+                write_times.append(time.perf_counter() - started)
+        else:
+            try:
+                ok = client.get('/api/transactions?limit=20').status_code == 200
+            except Exception:
+                ok = False
+            reads += ok
+        errors += not ok
+    results.put((writes, reads, errors, write_times))
+
+
+def run_mode(name, tuning, args):
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'{name}.db')
+    context = multiprocessing.get_context('spawn')
+    # Preparação num processo separado: a configuração é lida do ambiente na importação
+    with context.Pool(1) as pool:
+        user_ids = pool.apply(prepare, (database_url, tuning, args.workers))
+
+    results = context.Queue()
+    start_at = time.time() + 3  # todos começam juntos, depois de importar a aplicação
+    processes = [context.Process(target=worker, args=(database_url, tuning, user_id, args.seconds,
+                                                      args.write_ratio, start_at, results))
+                 for user_id in user_ids]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    writes = sum(r[0] for r in collected)
+    reads = sum(r[1] for r in collected)
+    errors = sum(r[2] for r in collected)
+    write_times = sorted(t for r in collected for t in r[3])
+    p95 = write_times[int(len(write_times) * 0.95)] * 1000 if write_times else float('nan')
+    print(f'{name:<8}{writes / args.seconds:>12.1f}{reads / args.seconds:>12.1f}{p95:>18.1f}{errors:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f'{args.workers} worker(s), {args.seconds:g}s por modo, {args.write_ratio:.0%} de escritas')
+    print(f'{"modo":<8}{"escritas/s":>12}{"leituras/s":>12}{"p95 escrita (ms)":>18}{"falhas":>8}')
+    for name, tuning in MODES.items():
+        run_mode(name, tuning, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Custo da coleta de métricas por requisição e do /metrics com vários workers.
+
+Uso: python benchmarks/bench_metrics.py [--requests 2000] [--workers 8]
+
+Monta duas instâncias da aplicação sobre o mesmo banco SQLite temporário,
+uma com METRICS_ENABLED e outra sem, e compara a latência média de
+endpoints leves (onde o overhead aparece mais) pelo test client. Depois
+mede o tempo de um scrape do /metrics somando os snapshots de --workers
+processos em METRICS_DIR.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = ('/api/cards', '/api/transactions?limit=20', '/dashboard')
+
+
+def make_client(app, email, password):
+    client = app.test_client()
+    if client.post('/login', data={'email': email, 'password': password}).status_code != 302:
+        raise SystemExit('Falha no login do usuário de benchmark.')
+    return client
+
+
+def timed_requests(client, path, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path)
+        if response.status_code >= 400:
+            raise SystemExit(f'{path}: HTTP {response.status_code}')
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Requisições por endpoint e configuração.')
+    parser.add_argument('--workers', type=int, default=8, help='Snapshots de workers somados no scrape.')
+    parser.add_argument('--transactions', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+    os.environ['METRICS_DIR'] = os.path.join(tmp, 'metrics')
+    os.environ['METRICS_TOKEN'] = 'bench'
+
+    from config import Config
+    from app import create_app, db
+    from app.metrics import metrics
+    from app.search import install_search_index
+    from seed import seed, BENCH_PASSWORD
+
+    Config.METRICS_ENABLED = False
+    app_off = create_app()
+    with app_off.app_context():
+        db.create_all()
+        install_search_index()
+        db.session.commit()
+        user_id = seed(1, args.transactions, 2)[0]
+    Config.METRICS_ENABLED = True
+    app_on = create_app()
+
+    email = f'bench{user_id}@example.com'
+    clients = {'sem métricas': make_client(app_off, email, BENCH_PASSWORD),
+               'com métricas': make_client(app_on, email, BENCH_PASSWORD)}
+
+    print(f'{"endpoint":<30}{"sem (µs)":>12}{"com (µs)":>12}{"overhead (µs)":>15}')
+    for path in ENDPOINTS:
+        for client in clients.values():
+            timed_requests(client, path, 20)  # aquecimento
+        # Alterna as configurações para diluir variações da máquina
+        off, on = 0.0, 0.0
+        for _ in range(4):
+            metrics.enabled = False
+            off += timed_requests(clients['sem métricas'], path, args.requests // 4) / 4
+            metrics.enabled = True
+            on += timed_requests(clients['com métricas'], path, args.requests // 4) / 4
+        print(f'{path:<30}{off * 1e6:>12.1f}{on * 1e6:>12.1f}{(on - off) * 1e6:>15.1f}')
+
+    # Outros workers: processos ociosos cujos pids recebem cópias do snapshot deste
+    metrics.flush(force=True)
+    with open(os.path.join(os.environ['METRICS_DIR'], f'{os.getpid()}.json')) as f:
+        snapshot = json.load(f)
+    idle = [subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(600)'])
+            for _ in range(args.workers - 1)]
+    try:
+        for process in idle:
+            snapshot['pid'] = process.pid
+            with open(os.path.join(os.environ['METRICS_DIR'], f'{process.pid}.json'), 'w') as f:
+                json.dump(snapshot, f)
+        client = clients['com métricas']
+        client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer bench'
+        scrape = timed_requests(client, '/metrics', 50)
+        lines = client.get('/metrics').get_data(as_text=True).count('\n')
+    finally:
+        for process in idle:
+            process.kill()
+    print(f'\nscrape do /metrics somando {args.workers} worker(s), {lines} linhas: {scrape * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
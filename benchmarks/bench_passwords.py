@@ -0,0 +1,93 @@
+"""Custo do hash de senha por método e CPU gasto numa rajada de logins com e sem limite.
+
+Uso: python benchmarks/bench_passwords.py [--methods scrypt pbkdf2:sha256:600000 ...]
+                                          [--threads 16] [--seconds 5]
+
+Primeiro mede o tempo médio de uma verificação para cada método (escolha
+de PASSWORD_HASH_METHOD). Depois simula um credential stuffing: --threads
+threads enviam POST /api/login com senhas erradas para a mesma conta, pelo
+test client, durante --seconds, com LOGIN_RATE_LIMIT desligado e ligado.
+Mostra tentativas/s, hashes calculados/s (respostas 401), respostas 429
+(limite ou fila de verificação cheia) e o CPU do processo por segundo de
+relógio.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_METHODS = ('scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000')
+
+
+def time_methods(methods, repeat=5):
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    print(f'{"método":<28}{"verificação (ms)":>18}')
+    for method in methods:
+        password_hash = generate_password_hash('senha de teste', method)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            check_password_hash(password_hash, 'senha errada')
+        print(f'{method:<28}{(time.perf_counter() - started) / repeat * 1000:>18.1f}')
+
+
+def burst(app, email, threads, seconds):
+    statuses = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def attacker():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            status = client.post('/api/login', json={'email': email, 'password': 'errada'}).status_code
+            with lock:
+                statuses.append(status)
+
+    cpu_started, started = time.process_time(), time.perf_counter()
+    workers = [threading.Thread(target=attacker) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return (len(statuses) / elapsed, statuses.count(401) / elapsed, statuses.count(429),
+            (time.process_time() - cpu_started) / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    time_methods(args.methods)
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['METRICS_ENABLED'] = '0'
+    from config import Config
+    from app import create_app, db
+    from app.models import User
+
+    print(f'\nrajada: {args.threads} threads, {args.seconds:g}s, método {Config.PASSWORD_HASH_METHOD}')
+    print(f'{"limite":<10}{"tentativas/s":>14}{"hashes/s":>10}{"429":>8}{"CPU/s":>8}')
+    for enabled in (False, True):
+        Config.LOGIN_RATE_LIMIT = enabled
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            if not User.query.filter_by(email='vitima@example.com').first():
+                user = User(username='vitima', email='vitima@example.com')
+                user.set_password('correta')
+                db.session.add(user)
+                db.session.commit()
+        rate, hashes, throttled, cpu = burst(app, 'vitima@example.com', args.threads, args.seconds)
+        print(f'{"ligado" if enabled else "desligado":<10}{rate:>14.1f}{hashes:>10.1f}{throttled:>8}{cpu:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
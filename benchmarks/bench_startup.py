@@ -0,0 +1,132 @@
+"""Subida a frio do gunicorn: tempo até a primeira resposta e memória por worker.
+
+Uso: python benchmarks/bench_startup.py [--workers 4] [--runs 3] [--database sqlite:///...]
+
+Compara dois modos sobre o mesmo banco já migrado:
+  "antes":  gunicorn run:app, cada worker importa a aplicação e roda
+            create_all + install_search_index ao subir;
+  "depois": gunicorn -c gunicorn.conf.py wsgi:app com FAST_START, --preload
+            e nenhum acesso ao banco na subida.
+Para cada execução mede o tempo do início do processo até o primeiro 200
+em /login e, depois de todos os workers atenderem, o RSS e o PSS (memória
+proporcional, que divide as páginas compartilhadas) de cada worker, lidos
+de /proc (só Linux). O tempo do "flask db upgrade" aparece à parte.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'antes': (['run:app'], {'FAST_START': '0'}),
+    'depois': (['-c', 'gunicorn.conf.py', 'wsgi:app'], {'FAST_START': '1'}),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memory_kib(pid):
+    """(RSS, PSS) do processo em KiB."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def children(pid):
+    result = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            result.append(int(entry))
+    return result
+
+
+def wait_first_response(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn encerrou com código {process.returncode}')
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.005)
+    raise SystemExit(f'Sem resposta de {url} em {timeout}s')
+
+
+def run_once(mode, args, env):
+    gunicorn_args, mode_env = MODES[mode]
+    port = free_port()
+    env = dict(env, **mode_env)
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--log-level', 'warning'] + gunicorn_args
+    url = f'http://127.0.0.1:{port}/login'
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        wait_first_response(url, process)
+        first_response = time.perf_counter() - started
+        # Requisições suficientes para que todos os workers tenham atendido alguma
+        for _ in range(args.workers * 10):
+            urllib.request.urlopen(url).read()
+        workers = children(process.pid)
+        memory = [memory_kib(pid) for pid in workers]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return first_response, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--database', default=None, help='URL do banco (padrão: SQLite temporário).')
+    args = parser.parse_args()
+
+    database_url = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    env = dict(os.environ, DATABASE_URL=database_url, METRICS_DIR=tempfile.mkdtemp())
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'db', 'upgrade'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    print(f'flask db upgrade: {time.perf_counter() - started:.2f}s (passo de deploy, uma vez)')
+
+    print(f'{args.workers} worker(s), {args.runs} execução(ões) por modo')
+    print(f'{"modo":<8}{"1ª resposta (ms)":>18}{"RSS/worker (MiB)":>18}{"PSS/worker (MiB)":>18}')
+    for mode in MODES:
+        timings, rss, pss = [], [], []
+        for _ in range(args.runs):
+            first_response, memory = run_once(mode, args, env)
+            timings.append(first_response * 1000)
+            rss += [r / 1024 for r, _ in memory]
+            pss += [p / 1024 for _, p in memory]
+        print(f'{mode:<8}{statistics.median(timings):>18.0f}{statistics.mean(rss):>18.1f}'
+              f'{statistics.mean(pss):>18.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Latência (p50/p95) e número de consultas das views mais usadas, pelo test client do Flask.
+
+Uso: python benchmarks/bench_views.py [--users 3] [--transactions 20000] [--cards 3]
+                                      [--iterations 30] [--save baseline.json]
+                                      [--baseline baseline.json --threshold 0.25]
+
+Cria um banco SQLite temporário, popula com benchmarks/seed.py e mede
+dashboard, reports, api.get_transactions, add, edit_card e clear_data como
+o usuário autenticado. Por padrão o cache de páginas é limpo antes de cada
+requisição (mede a renderização); use --warm-cache para medir os acertos.
+
+Com --baseline, sai com código 1 se o p95 de algum cenário piorar mais que
+--threshold (fração) ou se ele passar a fazer mais consultas.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mês usado pelo cenário clear_data (fora do período gerado pelo seed)
+CLEAR_YEAR, CLEAR_MONTH = 2000, 1
+CLEAR_ROWS = 200
+
+
+def build_scenarios(client, user_id, card_ids, rng):
+    """(nome, preparação não medida, requisição medida) de cada cenário."""
+    from app import db
+    from seed import insert_transactions
+
+    now = datetime.now()
+    state = {'renames': 0}
+
+    def add():
+        card_id = rng.choice(card_ids) if card_ids else None
+        return client.post('/add', data={
+            'action': 'add_transaction', 'type': 'expense', 'amount': f'{rng.uniform(5, 200):.2f}',
+            'description': 'Benchmark', 'category': 'Alimentação',
+            'payment_method': f'Cartão {card_ids.index(card_id) + 1}' if card_id else 'Dinheiro',
+        })
+
+    def edit_card():
+        state['renames'] += 1
+        return client.post(f'/edit_card/{card_ids[0]}', json={
+            'name': 'Cartão 1' if state['renames'] % 2 == 0 else 'Cartão 1 (renomeado)',
+            'due_day': 10,
+        })
+
+    def refill_clear_month():
+        insert_transactions([{
+            'type': 'expense', 'amount_cents': rng.randint(100, 10000), 'description': f'Antiga {i}',
+            'payment_method': None if card_ids else 'Dinheiro', 'card_id': card_ids[0] if card_ids else None,
+            'category': 'Outros', 'date': datetime(CLEAR_YEAR, CLEAR_MONTH, 1 + i % 28), 'user_id': user_id,
+        } for i in range(CLEAR_ROWS)])
+        db.session.commit()
+
+    return [
+        ('dashboard', None, lambda: client.get('/dashboard')),
+        ('reports', None, lambda: client.get(f'/reports?year={now.year}&month={now.month}')),
+        ('api.get_transactions', None, lambda: client.get('/api/transactions?limit=50')),
+        ('add', None, add),
+        ('edit_card', None, edit_card if card_ids else None),
+        ('clear_data', refill_clear_month,
+         lambda: client.post('/clear_data', json={'year': CLEAR_YEAR, 'month': CLEAR_MONTH})),
+    ]
+
+
+def run(args):
+    from sqlalchemy import event
+    from app import create_app, db, cache
+    from app.search import install_search_index
+    from seed import seed, BENCH_PASSWORD
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    results = {}
+    with app.app_context():
+        db.create_all()
+        install_search_index()
+        db.session.commit()
+        started = time.perf_counter()
+        user_ids = seed(args.users, args.transactions, args.cards, args.years, args.seed)
+        print(f'seed: {args.users} usuário(s) x {args.transactions} transações x {args.cards} cartões '
+              f'em {time.perf_counter() - started:.1f}s')
+
+        from app.models import Card
+        user_id = user_ids[0]
+        card_ids = [c.id for c in Card.query.filter_by(user_id=user_id).order_by(Card.id)]
+
+        queries = [0]
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*_):
+            queries[0] += 1
+
+        client = app.test_client()
+        response = client.post('/login', data={'email': f'bench{user_id}@example.com', 'password': BENCH_PASSWORD})
+        if response.status_code != 302:
+            raise SystemExit('Falha no login do usuário de benchmark.')
+
+        for name, prepare, request in build_scenarios(client, user_id, card_ids, rng):
+            if request is None:
+                continue
+            timings, counts = [], []
+            for i in range(args.warmup + args.iterations):
+                if prepare:
+                    prepare()
+                if not args.warm_cache:
+                    cache.backend.clear()
+                db.session.remove()
+                queries[0] = 0
+                started = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise SystemExit(f'{name}: HTTP {response.status_code}\n{response.get_data(as_text=True)[:500]}')
+                if i >= args.warmup:
+                    timings.append(elapsed * 1000)
+                    counts.append(queries[0])
+            results[name] = {
+                'p50': round(float(np.percentile(timings, 50)), 2),
+                'p95': round(float(np.percentile(timings, 95)), 2),
+                'mean': round(float(np.mean(timings)), 2),
+                'queries': max(counts),
+            }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Lista de regressões em relação ao baseline (p95 acima do limite ou mais consultas)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['p95'] > previous['p95'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {current['p95']:.2f} ms > {previous['p95']:.2f} ms "
+                               f"(+{threshold:.0%} permitido)")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {current['queries']} consultas > {previous['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--transactions', type=int, default=20000, help='Transações por usuário.')
+    parser.add_argument('--cards', type=int, default=3, help='Cartões por usuário.')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--warm-cache', action='store_true', help='Não limpa o cache entre as requisições.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default=None, help='URL do banco (padrão: SQLite temporário).')
+    parser.add_argument('--save', default=None, help='Grava os resultados em JSON (novo baseline).')
+    parser.add_argument('--baseline', default=None, help='JSON de uma execução anterior para comparação.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Piora máxima do p95 (fração).')
+    args = parser.parse_args()
+
+    # DATABASE_URL precisa estar definido antes de importar a aplicação (lido em config.py)
+    os.environ['DATABASE_URL'] = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    results = run(args)
+
+    print(f'{"cenário":<24}{"p50 (ms)":>10}{"p95 (ms)":>10}{"média":>10}{"consultas":>11}')
+    for name, r in results.items():
+        print(f"{name:<24}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['mean']:>10.2f}{r['queries']:>11}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'REGRESSÃO {line}')
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Gera dados sintéticos (usuários, cartões e transações) com inserts em massa.
+
+Uso: python benchmarks/seed.py [--users 10] [--transactions 5000] [--cards 2] [--years 2]
+
+Grava no banco configurado em DATABASE_URL (padrão: app.db). Todos os
+usuários gerados têm a senha BENCH_PASSWORD. As transações seguem
+distribuições realistas: salário todo dia 5, despesas concentradas em
+alimentação/transporte/lazer, valores log-normais por categoria, atividade
+crescente ao longo do período e parte das despesas nos cartões (o primeiro
+cartão é o mais usado). O rollup, as faturas e o índice de busca são
+atualizados pelos mesmos caminhos da importação.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = 'bench'
+DEFAULT_BATCH_SIZE = 5000
+
+# categoria: (peso, mediana em reais)
+EXPENSE_CATEGORIES = {
+    'Alimentação': (30, 45),
+    'Transporte': (18, 25),
+    'Lazer': (15, 80),
+    'Moradia': (8, 600),
+    'Saúde': (8, 120),
+    'Educação': (5, 300),
+    'Outros': (16, 60),
+}
+CASH_METHODS = ('Dinheiro', 'Cartao de Debito', 'Transferencia')
+CARD_SHARE = 0.4
+INCOME_SHARE = 0.1
+
+
+def _amount_cents(rng, median):
+    return max(int(rng.lognormvariate(math.log(median), 0.6) * 100), 100)
+
+
+def generate_transactions(rng, user_id, card_ids, count, start, end):
+    """Dicts com as colunas de Transaction; os salários mensais entram além de `count`."""
+    days = (end - start).days
+    month = datetime(start.year, start.month, 5)
+    while month < end:
+        if month >= start:
+            yield {'type': 'income', 'amount_cents': 500000 + rng.randint(0, 10) * 10000,
+                   'description': 'Salário', 'payment_method': 'Transferencia', 'card_id': None,
+                   'category': 'Salário', 'date': month, 'user_id': user_id}
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 5)
+
+    categories = list(EXPENSE_CATEGORIES)
+    weights = [EXPENSE_CATEGORIES[c][0] for c in categories]
+    card_weights = [1 / (i + 1) for i in range(len(card_ids))]
+    for i in range(count):
+        # Mais lançamentos nos meses recentes (distribuição triangular)
+        when = start + timedelta(days=int(rng.triangular(0, days, days)), minutes=rng.randint(420, 1380))
+        if rng.random() < INCOME_SHARE:
+            yield {'type': 'income', 'amount_cents': _amount_cents(rng, 400), 'description': f'Extra {i}',
+                   'payment_method': 'Transferencia', 'card_id': None, 'category': 'Outros',
+                   'date': when, 'user_id': user_id}
+            continue
+        category = rng.choices(categories, weights)[0]
+        card_id = rng.choices(card_ids, card_weights)[0] if card_ids and rng.random() < CARD_SHARE else None
+        yield {'type': 'expense', 'amount_cents': _amount_cents(rng, EXPENSE_CATEGORIES[category][1]),
+               'description': f'{category} {i}', 'payment_method': None if card_id else rng.choice(CASH_METHODS),
+               'card_id': card_id, 'category': category, 'date': when, 'user_id': user_id}
+
+
+def insert_transactions(rows):
+    """Insere as linhas com executemany e aplica os deltas do rollup e das faturas (sem commit)."""
+    from app import db
+    from app.models import Transaction
+    from app.aggregates import apply_summary_deltas, summary_key
+    from app.invoices import add_to_invoices
+
+    connection = db.session.connection()
+    connection.execute(Transaction.__table__.insert(), rows)
+    deltas = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = summary_key(row['user_id'], row['date'], row['type'], row['category'],
+                          row['payment_method'], row['card_id'])
+        deltas[key][0] += row['amount_cents']
+        deltas[key][1] += 1
+    apply_summary_deltas(connection, deltas)
+    add_to_invoices(connection, rows)
+
+
+def seed(users=10, transactions=5000, cards=2, years=2, rng_seed=42, batch_size=DEFAULT_BATCH_SIZE):
+    """Cria `users` usuários com `cards` cartões e `transactions` transações cada; retorna os ids.
+
+    Deve ser chamado dentro de um app context, com as tabelas já criadas.
+    """
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User, Card
+
+    rng = random.Random(rng_seed)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    end = datetime.now()
+    start = end - timedelta(days=365 * years)
+    first = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+
+    user_ids = []
+    for n in range(first, first + users):
+        user = User(username=f'bench{n}', email=f'bench{n}@example.com', password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        user_cards = [Card(name=f'Cartão {i + 1}', due_day=rng.choice((5, 10, 15, 20, 25)), user_id=user.id)
+                      for i in range(cards)]
+        db.session.add_all(user_cards)
+        db.session.flush()
+
+        batch = []
+        for row in generate_transactions(rng, user.id, [c.id for c in user_cards], transactions, start, end):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                insert_transactions(batch)
+                batch = []
+        if batch:
+            insert_transactions(batch)
+        db.session.commit()
+        user_ids.append(user.id)
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=5000, help='Transações por usuário.')
+    parser.add_argument('--cards', type=int, default=2, help='Cartões por usuário.')
+    parser.add_argument('--years', type=int, default=2, help='Período coberto pelas transações.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        user_ids = seed(args.users, args.transactions, args.cards, args.years, args.seed)
+    print(f'{len(user_ids)} usuário(s) criados (ids {user_ids[0]}-{user_ids[-1]}), senha "{BENCH_PASSWORD}".')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,43 @@ from dotenv import load_dotenv
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
+def _env_bool(name, default):
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes")
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS a partir do ambiente (pool, pre-ping e timeouts por banco)."""
+    options = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    if database_url.startswith("sqlite"):
+        # Espera pelo lock de escrita (o PRAGMA busy_timeout é aplicado em cada conexão)
+        options["connect_args"] = {"timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000}
+        options["pool_pre_ping"] = False  # arquivo local: não há conexão para cair
+    else:
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "5"))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        options["pool_timeout"] = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+        if database_url.startswith("postgresql"):
+            # Consultas que passarem do limite são canceladas pelo servidor (0 = sem limite)
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))}"
+            }
+    return options
+
+
+def async_engine_options(database_url):
+    """engine_options para os drivers assíncronos (aiosqlite/asyncpg) da API ASGI."""
+    options = engine_options(database_url)
+    if database_url.startswith("postgresql"):
+        # O asyncpg não aceita o "options" do libpq: o timeout vai como parâmetro da sessão
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")))}
+        }
+    return options
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "devkey")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -14,5 +51,73 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = database_url or \
         "sqlite:///" + os.path.join(basedir, "app.db")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Réplica de leitura (opcional): dashboard, relatórios, listagem, exportação e cartões
+    # leem dela; escritas vão ao primário. Depois de gravar algo, o usuário lê do primário
+    # por REPLICA_STICKY_SECONDS, até a réplica alcançar. Para testar localmente, basta
+    # apontar para uma cópia do arquivo SQLite ou para outra instância do Postgres
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url and replica_url.startswith("postgres://"):
+        replica_url = replica_url.replace("postgres://", "postgresql://", 1)
+    SQLALCHEMY_BINDS = {"replica": {"url": replica_url, **engine_options(replica_url)}} if replica_url else {}
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+    # PRAGMAs aplicados a cada nova conexão SQLite (SQLITE_TUNING=0 mantém os padrões do SQLite).
+    # WAL deixa leituras e a escrita acontecerem ao mesmo tempo entre os workers do gunicorn
+    SQLITE_TUNING = _env_bool("SQLITE_TUNING", True)
+    SQLITE_PRAGMAS = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negativo = KiB (64 MiB)
+    }
 
     DEBUG = os.getenv("FLASK_ENV") == "development"
+
+    # Proxies reversos confiáveis à frente da aplicação. Com N > 0 o IP do cliente (limite de
+    # login por IP) e o esquema vêm do X-Forwarded-For/-Proto dos N últimos saltos. Fica em 0
+    # (cabeçalhos ignorados) para conexões diretas; atrás do proxy do Render, PROXY_FIX_HOPS=1
+    PROXY_FIX_HOPS = int(os.getenv("PROXY_FIX_HOPS", "0"))
+
+    # Subida rápida (produção): o esquema vem só do "flask db upgrade" e os workers não
+    # acessam o banco ao iniciar. Sem ele, run.py cria as tabelas (desenvolvimento)
+    FAST_START = _env_bool("FAST_START", False)
+
+    # Cache de usuários e cartões: "memory" (LRU no processo) ou "redis"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+    # Senhas: método/custo no formato do werkzeug ("scrypt:32768:8:1", "pbkdf2:sha256:600000").
+    # Hashes antigos são regravados no próximo login. As verificações rodam em até
+    # PASSWORD_HASH_WORKERS threads por processo, com PASSWORD_HASH_QUEUE na fila
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "8"))
+
+    # Limite de tentativas de login (token bucket) por IP e por conta: BURST tentativas
+    # seguidas e PER_MINUTE repostas por minuto. Backend "memory" (por processo) ou "redis"
+    LOGIN_RATE_LIMIT = _env_bool("LOGIN_RATE_LIMIT", True)
+    LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+    LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "10"))
+    LOGIN_ACCOUNT_BURST = int(os.getenv("LOGIN_ACCOUNT_BURST", "5"))
+    LOGIN_ACCOUNT_PER_MINUTE = float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", "2"))
+    RATELIMIT_BACKEND = os.getenv("RATELIMIT_BACKEND", "memory")
+    RATELIMIT_REDIS_URL = os.getenv("RATELIMIT_REDIS_URL", CACHE_REDIS_URL)
+
+    # Diagnóstico (opt-in): contagem de consultas por requisição com Server-Timing e logs
+    # estruturados, e o endpoint /debug/profile/<caminho> com cProfile/pyinstrument
+    QUERY_INSTRUMENTATION = os.getenv("QUERY_INSTRUMENTATION") == "1"
+    DEBUG_PROFILE = os.getenv("DEBUG_PROFILE") == "1"
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+
+    # Métricas no formato Prometheus em /metrics. Com METRICS_DIR, os workers do gunicorn
+    # gravam snapshots nesse diretório e qualquer um deles exporta a soma de todos.
+    # O /metrics só responde com METRICS_TOKEN definido ("Authorization: Bearer <token>")
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
@@ -0,0 +1,40 @@
+"""Configuração do gunicorn para produção.
+
+Uso: flask --app wsgi db upgrade && gunicorn -c gunicorn.conf.py wsgi:app
+
+Com preload_app a aplicação (imports, numpy, blueprints, templates) é
+montada uma vez no processo mestre e os workers a herdam no fork,
+compartilhando essas páginas de memória (copy-on-write). Nenhum acesso ao
+banco acontece na subida: o esquema vem só do "flask db upgrade".
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+preload_app = True
+
+
+def when_ready(server):
+    from app import db
+
+    app = server.app.wsgi()
+    # Compila os templates no mestre, senão cada worker compila os seus na primeira requisição
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # Objetos já criados saem do alcance do GC: as varreduras nos workers não
+    # tocam (e portanto não copiam) as páginas herdadas do mestre
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import db
+
+    # Conexões abertas no mestre não podem ser usadas por dois processos
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
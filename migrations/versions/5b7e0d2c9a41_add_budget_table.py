@@ -0,0 +1,38 @@
+"""Adicionar tabela budget (orçamentos mensais por categoria)
+
+Revision ID: 5b7e0d2c9a41
+Revises: a9c4e2f7b318
+Create Date: 2026-10-17 20:12:47.301552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0d2c9a41'
+down_revision = 'a9c4e2f7b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A restrição única (user_id, year, month, category) também é o índice usado
+    # pela consulta de status e pela atualização incremental do gasto
+    op.create_table('budget',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('limit_cents', sa.BigInteger(), nullable=False),
+    sa.Column('spent_cents', sa.BigInteger(), nullable=False),
+    sa.Column('alert', sa.String(length=10), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'category', name='uq_budget_user_month_category')
+    )
+
+
+def downgrade():
+    op.drop_table('budget')
@@ -0,0 +1,56 @@
+"""Adicionar tabela monthly_summary (rollup mensal por usuário)
+
+Revision ID: 7c1f3a9b2d40
+Revises: e48a1cbda7e7
+Create Date: 2026-10-17 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1f3a9b2d40'
+down_revision = 'e48a1cbda7e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    monthly_summary = op.create_table('monthly_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=10), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('payment_method', sa.String(length=50), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'type', 'category', 'payment_method',
+                        name='uq_monthly_summary_key')
+    )
+
+    # Preenche o rollup com os dados já existentes
+    transaction = sa.table('transaction',
+        sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+        sa.column('type', sa.String), sa.column('amount', sa.Float),
+        sa.column('category', sa.String), sa.column('payment_method', sa.String),
+        sa.column('date', sa.DateTime))
+    year = sa.extract('year', transaction.c.date)
+    month = sa.extract('month', transaction.c.date)
+    category = sa.func.coalesce(transaction.c.category, '')
+    payment_method = sa.func.coalesce(transaction.c.payment_method, '')
+    op.execute(monthly_summary.insert().from_select(
+        ['user_id', 'year', 'month', 'type', 'category', 'payment_method', 'total', 'count'],
+        sa.select(transaction.c.user_id, year, month, transaction.c.type, category, payment_method,
+                  sa.func.sum(transaction.c.amount), sa.func.count(transaction.c.id))
+        .where(transaction.c.date.isnot(None))
+        .group_by(transaction.c.user_id, year, month, transaction.c.type, category, payment_method)
+    ))
+
+
+def downgrade():
+    op.drop_table('monthly_summary')
@@ -0,0 +1,69 @@
+"""Tirar o nome do cartão do índice de busca
+
+Bancos migrados com a primeira versão de a9c4e2f7b318 copiavam o nome do
+cartão para o índice e, ao renomear um cartão, reescreviam todas as suas
+transações (PostgreSQL) ou linhas do FTS (SQLite). A busca agora resolve o
+nome do cartão na consulta; aqui saem os triggers do cartão e o índice é
+repopulado sem os nomes.
+
+Revision ID: 8e2f1c7a5d93
+Revises: 5b7e0d2c9a41
+Create Date: 2026-10-17 21:04:12.518730
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2f1c7a5d93'
+down_revision = '5b7e0d2c9a41'
+branch_labels = None
+depends_on = None
+
+SQLITE_DDL = (
+    'DROP TRIGGER IF EXISTS card_fts_au',
+    'DROP TRIGGER IF EXISTS transaction_fts_ai',
+    """CREATE TRIGGER transaction_fts_ai AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+    'DROP TRIGGER IF EXISTS transaction_fts_au',
+    """CREATE TRIGGER transaction_fts_au
+    AFTER UPDATE OF user_id, description, category, payment_method ON "transaction" BEGIN
+        DELETE FROM transaction_fts WHERE rowid = old.id;
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+    'DELETE FROM transaction_fts',
+    """INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+    SELECT t.id, 'u' || t.user_id, t.description, t.category, t.payment_method FROM "transaction" t""",
+)
+
+POSTGRES_DDL = (
+    'DROP TRIGGER IF EXISTS card_search_vector ON card',
+    'DROP FUNCTION IF EXISTS card_search_vector_update()',
+    """CREATE OR REPLACE FUNCTION transaction_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple',
+            coalesce(NEW.description, '') || ' ' || coalesce(NEW.category, '') || ' ' ||
+            coalesce(NEW.payment_method, ''));
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS transaction_search_vector ON "transaction"',
+    """CREATE TRIGGER transaction_search_vector
+    BEFORE INSERT OR UPDATE OF description, category, payment_method ON "transaction"
+    FOR EACH ROW EXECUTE FUNCTION transaction_search_vector_update()""",
+    'UPDATE "transaction" SET description = description WHERE card_id IS NOT NULL',
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    for statement in POSTGRES_DDL if bind.dialect.name == 'postgresql' else SQLITE_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    # O índice sem os nomes também atende à versão anterior da busca (só não acha
+    # compras pelo nome do cartão); os triggers de cartão não são recriados
+    pass
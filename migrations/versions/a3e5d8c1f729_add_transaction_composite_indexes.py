@@ -0,0 +1,30 @@
+"""Adicionar índices compostos por usuário na tabela transaction
+
+Revision ID: a3e5d8c1f729
+Revises: 7c1f3a9b2d40
+Create Date: 2026-10-17 11:03:47.918265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e5d8c1f729'
+down_revision = '7c1f3a9b2d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_user_date', ['user_id', 'date'], unique=False)
+        batch_op.create_index('ix_transaction_user_payment_method', ['user_id', 'payment_method'], unique=False)
+        batch_op.create_index('ix_transaction_user_category', ['user_id', 'category'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_user_category')
+        batch_op.drop_index('ix_transaction_user_payment_method')
+        batch_op.drop_index('ix_transaction_user_date')
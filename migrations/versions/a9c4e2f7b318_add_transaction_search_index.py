@@ -0,0 +1,91 @@
+"""Adicionar índice de busca de texto completo nas transações
+
+SQLite: tabela virtual FTS5 (transaction_fts) mantida por triggers.
+PostgreSQL: coluna tsvector (search_vector) mantida por trigger, com índice GIN.
+O nome do cartão não entra no índice: a busca o resolve na consulta.
+
+Observação: no SQLite, migrações futuras que recriem a tabela transaction
+(batch_alter_table) removem os triggers; rode `flask search rebuild` depois.
+
+Revision ID: a9c4e2f7b318
+Revises: f2b8d6a04c17
+Create Date: 2026-10-17 19:55:31.027746
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e2f7b318'
+down_revision = 'f2b8d6a04c17'
+branch_labels = None
+depends_on = None
+
+SQLITE_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5(
+        owner, description, category, payment_method,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_ai AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_ad AFTER DELETE ON "transaction" BEGIN
+        DELETE FROM transaction_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_au
+    AFTER UPDATE OF user_id, description, category, payment_method ON "transaction" BEGIN
+        DELETE FROM transaction_fts WHERE rowid = old.id;
+        INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+        VALUES (new.id, 'u' || new.user_id, new.description, new.category, new.payment_method);
+    END""",
+)
+
+SQLITE_REBUILD = (
+    'DELETE FROM transaction_fts',
+    """INSERT INTO transaction_fts (rowid, owner, description, category, payment_method)
+    SELECT t.id, 'u' || t.user_id, t.description, t.category, t.payment_method FROM "transaction" t""",
+)
+
+POSTGRES_DDL = (
+    'ALTER TABLE "transaction" ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    """CREATE OR REPLACE FUNCTION transaction_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple',
+            coalesce(NEW.description, '') || ' ' || coalesce(NEW.category, '') || ' ' ||
+            coalesce(NEW.payment_method, ''));
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS transaction_search_vector ON "transaction"',
+    """CREATE TRIGGER transaction_search_vector
+    BEFORE INSERT OR UPDATE OF description, category, payment_method ON "transaction"
+    FOR EACH ROW EXECUTE FUNCTION transaction_search_vector_update()""",
+    'CREATE INDEX IF NOT EXISTS ix_transaction_search_vector ON "transaction" USING GIN (search_vector)',
+)
+
+POSTGRES_REBUILD = (
+    'UPDATE "transaction" SET description = description',
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        statements = POSTGRES_DDL + POSTGRES_REBUILD
+    else:
+        statements = SQLITE_DDL + SQLITE_REBUILD
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS transaction_search_vector ON "transaction"')
+        op.execute('DROP FUNCTION IF EXISTS transaction_search_vector_update()')
+        op.execute('DROP INDEX IF EXISTS ix_transaction_search_vector')
+        op.execute('ALTER TABLE "transaction" DROP COLUMN IF EXISTS search_vector')
+    else:
+        for trigger in ('transaction_fts_au', 'transaction_fts_ad', 'transaction_fts_ai'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS transaction_fts')
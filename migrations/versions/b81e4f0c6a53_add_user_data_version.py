@@ -0,0 +1,26 @@
+"""Adicionar data_version na tabela user
+
+Revision ID: b81e4f0c6a53
+Revises: a3e5d8c1f729
+Create Date: 2026-10-17 13:26:05.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e4f0c6a53'
+down_revision = 'a3e5d8c1f729'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,74 @@
+"""Guardar valores em centavos inteiros (amount_cents / total_cents)
+
+Revision ID: c2d9a7e41b86
+Revises: b81e4f0c6a53
+Create Date: 2026-10-17 15:02:44.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d9a7e41b86'
+down_revision = 'b81e4f0c6a53'
+branch_labels = None
+depends_on = None
+
+
+transaction = sa.table('transaction',
+    sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+    sa.column('type', sa.String), sa.column('amount', sa.Float),
+    sa.column('amount_cents', sa.BigInteger), sa.column('category', sa.String),
+    sa.column('payment_method', sa.String), sa.column('date', sa.DateTime))
+
+monthly_summary = sa.table('monthly_summary',
+    sa.column('user_id', sa.Integer), sa.column('year', sa.Integer), sa.column('month', sa.Integer),
+    sa.column('type', sa.String), sa.column('category', sa.String), sa.column('payment_method', sa.String),
+    sa.column('total', sa.Float), sa.column('total_cents', sa.BigInteger), sa.column('count', sa.Integer))
+
+
+def rebuild_summary(amount_column, total_column):
+    year = sa.extract('year', transaction.c.date)
+    month = sa.extract('month', transaction.c.date)
+    category = sa.func.coalesce(transaction.c.category, '')
+    payment_method = sa.func.coalesce(transaction.c.payment_method, '')
+    op.execute(monthly_summary.delete())
+    op.execute(monthly_summary.insert().from_select(
+        ['user_id', 'year', 'month', 'type', 'category', 'payment_method', total_column, 'count'],
+        sa.select(transaction.c.user_id, year, month, transaction.c.type, category, payment_method,
+                  sa.func.sum(transaction.c[amount_column]), sa.func.count(transaction.c.id))
+        .where(transaction.c.date.isnot(None))
+        .group_by(transaction.c.user_id, year, month, transaction.c.type, category, payment_method)
+    ))
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+    op.execute(transaction.update().values(
+        amount_cents=sa.cast(sa.func.round(transaction.c.amount * 100), sa.BigInteger)
+    ))
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column('amount_cents', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_column('amount')
+
+    with op.batch_alter_table('monthly_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_cents', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.drop_column('total')
+    # O rollup é recalculado a partir dos centavos para eliminar a deriva dos floats
+    rebuild_summary('amount_cents', 'total_cents')
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+    op.execute(transaction.update().values(amount=transaction.c.amount_cents / 100.0))
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), nullable=False)
+        batch_op.drop_column('amount_cents')
+
+    with op.batch_alter_table('monthly_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total', sa.Float(), nullable=False, server_default='0'))
+        batch_op.drop_column('total_cents')
+    rebuild_summary('amount', 'total')
@@ -0,0 +1,101 @@
+"""Adicionar closing_day em card e a tabela invoice (faturas por ciclo)
+
+Revision ID: d4f19b7e3a02
+Revises: c2d9a7e41b86
+Create Date: 2026-10-17 16:02:47.391205
+
+"""
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f19b7e3a02'
+down_revision = 'c2d9a7e41b86'
+branch_labels = None
+depends_on = None
+
+
+def _clamp_day(year, month, day):
+    return date(year, month, min(day, monthrange(year, month)[1]))
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def upgrade():
+    with op.batch_alter_table('card', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('closing_day', sa.Integer(), nullable=True))
+
+    invoice = op.create_table('invoice',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('closing_date', sa.Date(), nullable=False),
+    sa.Column('due_date', sa.Date(), nullable=False),
+    sa.Column('total_cents', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['card.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('card_id', 'year', 'month', name='uq_invoice_card_cycle')
+    )
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.create_index('ix_invoice_user_status', ['user_id', 'status'], unique=False)
+
+    # Preenche as faturas com as despesas já existentes (fechamento padrão: 7 dias antes do vencimento)
+    card = sa.table('card', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                    sa.column('name', sa.String), sa.column('due_day', sa.Integer))
+    transaction = sa.table('transaction',
+        sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+        sa.column('type', sa.String), sa.column('amount_cents', sa.BigInteger),
+        sa.column('payment_method', sa.String), sa.column('date', sa.DateTime))
+    year = sa.extract('year', transaction.c.date)
+    month = sa.extract('month', transaction.c.date)
+    day = sa.extract('day', transaction.c.date)
+    rows = op.get_bind().execute(
+        sa.select(card.c.id, card.c.user_id, card.c.due_day, year, month, day,
+                  sa.func.sum(transaction.c.amount_cents), sa.func.count(transaction.c.id))
+        .select_from(card.join(transaction, sa.and_(transaction.c.user_id == card.c.user_id,
+                                                    transaction.c.payment_method == card.c.name)))
+        .where(transaction.c.type == 'expense', transaction.c.date.isnot(None))
+        .group_by(card.c.id, card.c.user_id, card.c.due_day, year, month, day)
+    ).all()
+
+    cycles = defaultdict(lambda: [0, 0])
+    for card_id, user_id, due_day, y, m, d, cents, count in rows:
+        closing_day = due_day - 7 if due_day > 7 else due_day + 23
+        y, m = int(y), int(m)
+        if int(d) > _clamp_day(y, m, closing_day).day:
+            y, m = _next_month(y, m)
+        key = (card_id, user_id, due_day, closing_day, y, m)
+        cycles[key][0] += int(cents)
+        cycles[key][1] += count
+
+    today = date.today()
+    values = []
+    for (card_id, user_id, due_day, closing_day, y, m), (cents, count) in cycles.items():
+        closing = _clamp_day(y, m, closing_day)
+        due = _clamp_day(y, m, due_day) if due_day > closing_day else _clamp_day(*_next_month(y, m), due_day)
+        values.append({'user_id': user_id, 'card_id': card_id, 'year': y, 'month': m,
+                       'closing_date': closing, 'due_date': due, 'total_cents': cents, 'count': count,
+                       'status': 'open' if closing >= today else 'closed'})
+    if values:
+        op.bulk_insert(invoice, values)
+
+
+def downgrade():
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.drop_index('ix_invoice_user_status')
+
+    op.drop_table('invoice')
+    with op.batch_alter_table('card', schema=None) as batch_op:
+        batch_op.drop_column('closing_day')
@@ -0,0 +1,63 @@
+"""Ligar transações aos cartões por card_id (FK) em vez do nome
+
+Revision ID: e7a3c5d91f48
+Revises: d4f19b7e3a02
+Create Date: 2026-10-17 17:21:09.604317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5d91f48'
+down_revision = 'd4f19b7e3a02'
+branch_labels = None
+depends_on = None
+
+card = sa.table('card', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                sa.column('name', sa.String))
+transaction = sa.table('transaction', sa.column('user_id', sa.Integer), sa.column('card_id', sa.Integer),
+                       sa.column('payment_method', sa.String))
+monthly_summary = sa.table('monthly_summary', sa.column('user_id', sa.Integer),
+                           sa.column('payment_method', sa.String))
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Bancos criados com db.create_all() em versões antigas podem já ter a coluna (sem FK nem índice)
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('transaction')}
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        if 'card_id' not in columns:
+            batch_op.add_column(sa.Column('card_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_transaction_card_id', 'card', ['card_id'], ['id'])
+        batch_op.create_index('ix_transaction_card_date', ['card_id', 'date'], unique=False)
+
+    # Vincula as transações pelo nome do cartão; no rollup elas passam a ser agrupadas por 'card:<id>'
+    for card_id, user_id, name in bind.execute(
+            sa.select(card.c.id, card.c.user_id, card.c.name).order_by(card.c.id)).all():
+        bind.execute(transaction.update().where(
+            transaction.c.user_id == user_id,
+            transaction.c.payment_method == name,
+            transaction.c.card_id.is_(None)
+        ).values(card_id=card_id, payment_method=None))
+        bind.execute(monthly_summary.update().where(
+            monthly_summary.c.user_id == user_id,
+            monthly_summary.c.payment_method == name
+        ).values(payment_method=f'card:{card_id}'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    for card_id, user_id, name in bind.execute(sa.select(card.c.id, card.c.user_id, card.c.name)).all():
+        bind.execute(transaction.update().where(transaction.c.card_id == card_id)
+                     .values(payment_method=name))
+        bind.execute(monthly_summary.update().where(
+            monthly_summary.c.user_id == user_id,
+            monthly_summary.c.payment_method == f'card:{card_id}'
+        ).values(payment_method=name))
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_card_date')
+        batch_op.drop_constraint('fk_transaction_card_id', type_='foreignkey')
+        batch_op.drop_column('card_id')
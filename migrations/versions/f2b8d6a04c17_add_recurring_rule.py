@@ -0,0 +1,48 @@
+"""Adicionar tabela recurring_rule (transações recorrentes)
+
+Revision ID: f2b8d6a04c17
+Revises: e7a3c5d91f48
+Create Date: 2026-10-17 18:40:12.815390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d6a04c17'
+down_revision = 'e7a3c5d91f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recurring_rule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=10), nullable=False),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=True),
+    sa.Column('category', sa.String(length=50), nullable=True),
+    sa.Column('payment_method', sa.String(length=50), nullable=True),
+    sa.Column('card_id', sa.Integer(), nullable=True),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('next_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['card.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('recurring_rule', schema=None) as batch_op:
+        batch_op.create_index('ix_recurring_rule_active_next_date', ['active', 'next_date'], unique=False)
+        batch_op.create_index('ix_recurring_rule_user_next_date', ['user_id', 'next_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recurring_rule', schema=None) as batch_op:
+        batch_op.drop_index('ix_recurring_rule_user_next_date')
+        batch_op.drop_index('ix_recurring_rule_active_next_date')
+
+    op.drop_table('recurring_rule')
@@ -1,10 +1,15 @@
 from app import create_app, db
+from app.search import install_search_index
 
 app = create_app()
 
-# Garante que as tabelas do banco de dados sejam criadas antes da primeira requisição
-with app.app_context():
-    db.create_all()
+# Em desenvolvimento, garante que as tabelas existam antes da primeira requisição.
+# Com FAST_START o esquema é responsabilidade do "flask db upgrade" (veja gunicorn.conf.py)
+if not app.config['FAST_START']:
+    with app.app_context():
+        db.create_all()
+        install_search_index()  # tabela/triggers de busca não são criados pelo create_all
+        db.session.commit()
 
 if __name__ == "__main__":
     # Remova debug=True para produção
@@ -0,0 +1,7 @@
+"""Ponto de entrada WSGI de produção: só monta a aplicação, sem nenhum acesso ao banco.
+
+O esquema é aplicado antes, com "flask --app wsgi db upgrade"; veja gunicorn.conf.py.
+"""
+from app import create_app
+
+app = create_app()